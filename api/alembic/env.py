@@ -17,7 +17,7 @@ if config.config_file_name is not None:
 # for 'autogenerate' support
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
-from app.models import station, geographic_area, stations_by_geographic_area
+from app.models import station, geographic_area, stations_by_geographic_area, google_response, google_usage, station_approach_route
 from app.db.database import BASE
 target_metadata = BASE.metadata
 
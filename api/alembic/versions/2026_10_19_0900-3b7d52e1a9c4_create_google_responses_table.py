@@ -0,0 +1,40 @@
+"""Create google_responses table
+
+Revision ID: 3b7d52e1a9c4
+Revises: f543bd8bcf46
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7d52e1a9c4'
+down_revision: Union[str, None] = 'f543bd8bcf46'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('google_responses',
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('call_type', sa.String(), nullable=False),
+    sa.Column('response', sa.Text(), nullable=False),
+    sa.Column('fetched_at', sa.Float(), nullable=False),
+    sa.Column('hit_count', sa.Integer(), nullable=False),
+    sa.Column('last_hit_at', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_google_responses_hit_count'), 'google_responses', ['hit_count'], unique=False)
+    op.create_index(op.f('ix_google_responses_fetched_at'), 'google_responses', ['fetched_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_google_responses_fetched_at'), table_name='google_responses')
+    op.drop_index(op.f('ix_google_responses_hit_count'), table_name='google_responses')
+    op.drop_table('google_responses')
@@ -0,0 +1,42 @@
+"""Create station_approach_routes table
+
+Revision ID: 8e41c07f2d15
+Revises: 3b7d52e1a9c4
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e41c07f2d15'
+down_revision: Union[str, None] = '3b7d52e1a9c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('station_approach_routes',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('station_id', sa.Integer(), nullable=False),
+    sa.Column('bearing', sa.Integer(), nullable=False),
+    sa.Column('radius', sa.Float(), nullable=False),
+    sa.Column('entry_latitude', sa.Float(), nullable=False),
+    sa.Column('entry_longitude', sa.Float(), nullable=False),
+    sa.Column('steps', sa.Text(), nullable=False),
+    sa.Column('distance', sa.Float(), nullable=False),
+    sa.Column('fetched_at', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['station_id'], ['stations.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_station_approach_routes_station_id'), 'station_approach_routes', ['station_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_station_approach_routes_station_id'), table_name='station_approach_routes')
+    op.drop_table('station_approach_routes')
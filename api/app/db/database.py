@@ -2,19 +2,39 @@
 import os
 from fastapi import Request
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
 
 load_dotenv()  # Load environment variables from .env
 
-engine = create_engine(os.getenv('DATABASE_URL'))
+
+def engine_options(url):
+    """
+    Connection pool settings from the environment. Requests only need a connection
+    while the station data isn't cached, so the pool is sized for startup and
+    background writes rather than for request concurrency.
+    """
+    if make_url(url).get_backend_name() == 'sqlite':
+        # SQLite uses its own pool classes, which don't take these settings
+        return {}
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '5')),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+    }
+
+
+engine = create_engine(os.getenv('DATABASE_URL'), **engine_options(os.getenv('DATABASE_URL')))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 BASE = declarative_base()
 
 
 def request_db():
+    db = SessionLocal()
     try:
-        db = SessionLocal()
         yield db
     finally:
         db.close()
@@ -1,9 +1,53 @@
+import logging
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app.routers.admin_router import AdminRouter
 from app.routers.api_router import ApiRouter
+from app.services import quota, response_cache, route_fragments
+from app.services.loop_monitor import EventLoopLagMonitor
+from app.services.location_service import load_station_catalog
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the station catalog before serving traffic. With a snapshot on disk
+    # this doesn't touch the database; if neither is available, the first
+    # request will try again.
+    try:
+        load_station_catalog()
+    except Exception:
+        logger.exception("Unable to load station catalog at startup")
+    # Precomputed station approaches; without them directions are routed in full
+    try:
+        route_fragments.load_route_fragments()
+    except Exception:
+        logger.exception("Unable to load station approach routes")
+    # Pick up today's Google Maps usage by earlier and other processes, so the
+    # daily budgets aren't reset by a restart
+    try:
+        quota.quota_tracker.sync()
+    except Exception:
+        logger.exception("Unable to load Google Maps usage")
+    # Preload the most requested Google responses so a new task doesn't start cold
+    try:
+        response_cache.cache.warm_up(int(os.getenv('GOOGLE_CACHE_WARM_ENTRIES', '1000')))
+    except Exception:
+        logger.exception("Unable to warm up the Google response cache")
+    # Log the blocking stack whenever the event loop stalls past the threshold
+    loop_monitor = None
+    if os.getenv('EVENT_LOOP_LAG_THRESHOLD_MS'):
+        loop_monitor = EventLoopLagMonitor(float(os.getenv('EVENT_LOOP_LAG_THRESHOLD_MS')) / 1000)
+        await loop_monitor.start()
+    yield
+    if loop_monitor is not None:
+        await loop_monitor.stop()
+    response_cache.cache.shutdown()
+    quota.quota_tracker.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = os.getenv('CORS_ORIGINS', '').split(',')
 
@@ -17,6 +61,10 @@ app.add_middleware(
 
 app.include_router(ApiRouter, prefix="/api")
 
+# Admin endpoints are opt-in, and need a token to use
+if os.getenv('ADMIN_ENDPOINTS_ENABLED', 'false').lower() == 'true' and os.getenv('ADMIN_TOKEN'):
+    app.include_router(AdminRouter, prefix="/admin")
+
 @app.get("/")
 def read_root():
     return {"message": "SEPTA Walking App API"}
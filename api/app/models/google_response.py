@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Float, Integer, String, Text
+from ..db.database import BASE
+
+
+# Persisted Google Maps API responses, so cached results survive restarts
+class GoogleResponse(BASE):
+    __tablename__ = 'google_responses'
+
+    # attributes
+    key = Column(String, primary_key=True)
+    call_type = Column(String, nullable=False)
+    response = Column(Text, nullable=False)
+    fetched_at = Column(Float, nullable=False, index=True)
+    hit_count = Column(Integer, nullable=False, default=0, index=True)
+    last_hit_at = Column(Float, nullable=True)
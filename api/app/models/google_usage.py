@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String
+from ..db.database import BASE
+
+
+# Billed Google Maps units per call type and UTC day, summed over every process
+class GoogleUsage(BASE):
+    __tablename__ = 'google_usage'
+
+    # attributes
+    call_type = Column(String, primary_key=True)
+    day = Column(Integer, primary_key=True)
+    used = Column(Integer, nullable=False, default=0)
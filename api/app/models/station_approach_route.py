@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Float, ForeignKey, Integer, Text
+from sqlalchemy.orm import relationship
+from ..db.database import BASE
+
+
+# Precomputed walking route from an entry point near a station to the station. The
+# entry point is where Google starts the route, on a walkable street.
+class StationApproachRoute(BASE):
+    __tablename__ = 'station_approach_routes'
+
+    # attributes
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    station_id = Column(Integer(), ForeignKey("stations.id"), nullable=False, index=True)
+    bearing = Column(Integer, nullable=False)
+    radius = Column(Float, nullable=False)
+    entry_latitude = Column(Float, nullable=False)
+    entry_longitude = Column(Float, nullable=False)
+    steps = Column(Text, nullable=False)
+    # Walking distance of the route in meters
+    distance = Column(Float, nullable=False)
+    fetched_at = Column(Float, nullable=False)
+
+    # relationships
+    station = relationship("Station")
+
+
+from .station import Station
@@ -0,0 +1,41 @@
+"""JSON responses encoded with orjson, with support for pre-rendered fragments."""
+import orjson
+from fastapi.responses import Response
+
+
+class PrerenderedJSON(bytes):
+    """Already encoded JSON, spliced into a response as is instead of being re-encoded."""
+
+
+def render_json(content):
+    """
+    Encode content to JSON bytes. Dicts may hold PrerenderedJSON values at any depth,
+    which are copied into the output without being decoded.
+    """
+    if isinstance(content, PrerenderedJSON):
+        return bytes(content)
+    if isinstance(content, dict) and _has_prerendered(content):
+        return b'{' + b','.join(
+            orjson.dumps(str(key)) + b':' + render_json(value)
+            for key, value in content.items()
+        ) + b'}'
+    return orjson.dumps(content)
+
+
+def _has_prerendered(content):
+    return any(
+        isinstance(value, PrerenderedJSON)
+        or (isinstance(value, dict) and _has_prerendered(value))
+        for value in content.values()
+    )
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response rendered with orjson. Returning it from an endpoint also skips
+    FastAPI's generic jsonable_encoder pass over the content.
+    """
+    media_type = 'application/json'
+
+    def render(self, content):
+        return render_json(content)
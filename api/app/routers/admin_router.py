@@ -0,0 +1,75 @@
+import hmac
+import os
+import threading
+import time
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from app.services.profiler import PROFILE_MODES, SamplingProfiler
+
+AdminRouter = APIRouter()
+
+PROFILE_MAX_SECONDS = float(os.getenv('ADMIN_PROFILE_MAX_SECONDS', '60'))
+
+# Only one profile runs at a time, so a second one can't skew the first
+profile_lock = threading.Lock()
+
+def require_admin_token(request: Request):
+    """Requires an 'Authorization: Bearer <ADMIN_TOKEN>' header."""
+    admin_token = os.getenv('ADMIN_TOKEN')
+    authorization = request.headers.get('authorization', '')
+    scheme, _, token = authorization.partition(' ')
+    if (
+        not admin_token
+        or scheme.lower() != 'bearer'
+        or not hmac.compare_digest(token.encode('utf-8'), admin_token.encode('utf-8'))
+    ):
+        raise HTTPException(
+            status_code=401,
+            detail="A valid admin token is required",
+            headers={'WWW-Authenticate': 'Bearer'},
+        )
+
+@AdminRouter.get("/profile", dependencies=[Depends(require_admin_token)])
+async def profile(
+    seconds: float = Query(10, gt=0),
+    mode: str = Query('wall'),
+    interval_ms: float = Query(5, ge=1, le=1000),
+):
+    """
+    Sample every thread in this worker for the given number of seconds and return
+    the stacks in folded format, for flamegraph.pl or speedscope.
+    """
+    if seconds > PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"seconds must be at most {PROFILE_MAX_SECONDS:g}"
+        )
+    if mode not in PROFILE_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"mode must be one of {', '.join(PROFILE_MODES)}"
+        )
+    try:
+        profiler = SamplingProfiler(interval=interval_ms / 1000, mode=mode)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    if not profile_lock.acquire(blocking=False):
+        raise HTTPException(
+            status_code=409,
+            detail="A profile is already running"
+        )
+    try:
+        # Sample from a worker thread so the event loop keeps serving, and is sampled too
+        folded = await run_in_threadpool(profiler.run, seconds)
+    finally:
+        profile_lock.release()
+
+    filename = f"profile-{mode}-{int(time.time())}.folded"
+    return PlainTextResponse(
+        folded,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
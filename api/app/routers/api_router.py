@@ -1,16 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from app.db.database import request_db
-from app.services.location_service import LocationService
+from app.responses import FastJSONResponse
+from app.services.location_service import LocationService, load_station_catalog, station_catalog_loaded
+from app.services.quota import QuotaExceeded
 
-ApiRouter = APIRouter()
+ApiRouter = APIRouter(default_response_class=FastJSONResponse)
+
+STATIONS_CACHE_MAX_AGE = int(os.getenv('STATIONS_CACHE_MAX_AGE', '3600'))
 
 class Location(BaseModel):
     location_type: str
     latitude: float = None
     longitude: float = None
     address: str = None
+    line: str = None
+    exclude_stations: list[str] = None
 
 def validate_coordinate(value, name, min_val, max_val):
     if value is not None:
@@ -26,10 +33,45 @@ def validate_coordinate(value, name, min_val, max_val):
             )
     return value
 
+def request_db_if_cold():
+    """
+    A database session, but only while the station catalog isn't cached. Once it
+    is, requests don't touch the database, so they don't hold a pooled connection.
+    """
+    if station_catalog_loaded():
+        yield None
+    else:
+        yield from request_db()
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header value matches the given ETag."""
+    if if_none_match is None:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in [tag.removeprefix('W/') for tag in tags]
+
+@ApiRouter.get("/stations")
+async def all_stations(
+    request: Request,
+    db: Session = Depends(request_db_if_cold),
+):
+    """
+    All stations as a GeoJSON FeatureCollection. The body is rendered once when the
+    station catalog loads, and clients can revalidate it with its ETag.
+    """
+    station_catalog = load_station_catalog(db)
+    headers = {
+        'ETag': station_catalog.etag,
+        'Cache-Control': f'public, max-age={STATIONS_CACHE_MAX_AGE}',
+    }
+    if etag_matches(request.headers.get('if-none-match'), station_catalog.etag):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(station_catalog.feature_collection, headers=headers)
+
 @ApiRouter.post("")
 async def nearest_station_with_walking_directions(
     location: Location,
-    db: Session = Depends(request_db),
+    db: Session = Depends(request_db_if_cold),
 ):
     if location.location_type == "address" and location.address is None:
         raise HTTPException(
@@ -50,32 +92,89 @@ async def nearest_station_with_walking_directions(
 
     try:
         location_service = LocationService(db)
+        plan = location_service.service_plan()
         origin_param = location.address if location.location_type == "address" else (location.latitude, location.longitude)
-        # Is origin reasonably within SEPTA's coverage area? If not, return an error.
-        validation_message = location_service.validate_origin_in_septa_area(origin_param)
-        if validation_message:
-            raise HTTPException(
-                status_code=400,
-                detail=validation_message
+        if plan.validate_with_distance_matrix:
+            # Is origin reasonably within SEPTA's coverage area? If not, return an error.
+            validation_message = location_service.validate_origin_in_septa_area(origin_param)
+            if validation_message:
+                raise HTTPException(
+                    status_code=400,
+                    detail=validation_message
+                )
+
+            # Geocode origin and use that to find the geographic area that contains it.
+            # For this, it will either be NJ, DE, or a county in PA (Delaware,
+            # Montgomery, Chester, Bucks, or Philadelphia).
+            origin_geocode = location_service.origin_geocode(location.location_type, origin_param)
+            origin_coordinates = location_service.origin_coordinates(
+                location.location_type, origin_param, origin_geocode
+            )
+        else:
+            # Near the distance matrix budget the origin is checked by straight-line
+            # distance, which needs its coordinates first. Coordinates don't need a
+            # reverse geocode at all when the area isn't used.
+            origin_geocode = None
+            if location.location_type == "address" or not plan.straight_line_only:
+                origin_geocode = location_service.origin_geocode(location.location_type, origin_param)
+            origin_coordinates = location_service.origin_coordinates(
+                location.location_type, origin_param, origin_geocode
             )
-        
-        # Geocode origin and use that to find the geographic area that contains it.
-        # For this, it will either be NJ, DE, or a county in PA (Delaware,
-        # Montgomery, Chester, Bucks, or Philadelphia).
-        origin_geocode = location_service.origin_geocode(location.location_type, origin_param)
-        matching_searchable_area = location_service.origin_within(origin_geocode)
+            validation_message = location_service.validate_origin_by_straight_line(
+                origin_param, origin_coordinates
+            )
+            if validation_message:
+                raise HTTPException(
+                    status_code=400,
+                    detail=validation_message
+                )
+
+        # With no distance matrix calls left, search every station by straight-line
+        # distance instead of the ones in the origin's area.
+        matching_searchable_area = None if plan.straight_line_only else location_service.origin_within(origin_geocode)
 
         # Get the closest station in the geographic area
         closest_station = location_service.shortest_walk_in_area(
             origin_param,
-            matching_searchable_area
+            matching_searchable_area,
+            line=location.line,
+            exclude_stations=location.exclude_stations,
+            origin_coordinates=origin_coordinates,
+            candidate_limit=plan.candidate_limit,
         )
-        return {
-            "station": location_service.station_to_geojson(closest_station),
-            "directions": location_service.walking_directions(origin_param, closest_station),
+        if closest_station is None:
+            if location.line is not None or location.exclude_stations:
+                detail = "No stations near the origin match the requested line or exclusions"
+            else:
+                detail = f"Sorry, no viable route for walking can be found for {origin_param}. Please try again."
+            raise HTTPException(
+                status_code=400,
+                detail=detail
+            )
+
+        directions = []
+        if plan.include_directions:
+            try:
+                directions = location_service.walking_directions(
+                    origin_param, closest_station, origin_coordinates
+                )
+            except QuotaExceeded:
+                plan.omit_directions()
+
+        response = {
+            "station": location_service.station_geojson(closest_station),
+            "directions": directions,
         }
+        if plan.as_response():
+            response["degraded"] = plan.as_response()
+        return FastJSONResponse(response)
     except HTTPException as e:
         raise e
+    except QuotaExceeded as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"{str(e)}. Please try again later."
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500,
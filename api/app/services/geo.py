@@ -0,0 +1,62 @@
+"""Vectorized great-circle distance and ranking over station coordinates."""
+import math
+import numpy as np
+
+EARTH_RADIUS_METERS = 6371008.8
+
+
+def haversine_matrix(origin_latitudes, origin_longitudes, latitudes, longitudes):
+    """
+    Great-circle distances in meters from every origin to every station. Takes
+    arrays of origin and station coordinates in degrees and returns an array of
+    shape (origins, stations).
+    """
+    origin_lat = np.radians(np.asarray(origin_latitudes, dtype=np.float64))[:, np.newaxis]
+    origin_lon = np.radians(np.asarray(origin_longitudes, dtype=np.float64))[:, np.newaxis]
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))[np.newaxis, :]
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))[np.newaxis, :]
+
+    a = np.sin((lat - origin_lat) / 2) ** 2
+    a += np.cos(origin_lat) * np.cos(lat) * np.sin((lon - origin_lon) / 2) ** 2
+    np.clip(a, 0.0, 1.0, out=a)
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(a))
+
+
+def haversine(origin, latitudes, longitudes):
+    """Great-circle distances in meters from a single (lat, lon) origin to every station."""
+    return haversine_matrix([origin[0]], [origin[1]], latitudes, longitudes)[0]
+
+
+def nearest(distances, limit=None):
+    """
+    Column indexes of each row of a distance matrix ordered nearest first. When a
+    limit is given only that many are returned per row, using a partial sort so
+    large batches don't pay for ordering stations that will be dropped anyway.
+    """
+    distances = np.atleast_2d(distances)
+    if limit is None or limit >= distances.shape[1]:
+        return np.argsort(distances, axis=1, kind='stable')
+    partitioned = np.argpartition(distances, limit - 1, axis=1)[:, :limit]
+    order = np.argsort(np.take_along_axis(distances, partitioned, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(partitioned, order, axis=1)
+
+
+def destination_point(origin, bearing, distance):
+    """
+    The (lat, lon) reached by travelling distance meters from a (lat, lon) origin
+    along an initial bearing in degrees clockwise from north.
+    """
+    lat = math.radians(origin[0])
+    lon = math.radians(origin[1])
+    bearing = math.radians(bearing)
+    angular_distance = distance / EARTH_RADIUS_METERS
+
+    destination_lat = math.asin(
+        math.sin(lat) * math.cos(angular_distance)
+        + math.cos(lat) * math.sin(angular_distance) * math.cos(bearing)
+    )
+    destination_lon = lon + math.atan2(
+        math.sin(bearing) * math.sin(angular_distance) * math.cos(lat),
+        math.cos(angular_distance) - math.sin(lat) * math.sin(destination_lat),
+    )
+    return (math.degrees(destination_lat), (math.degrees(destination_lon) + 540) % 360 - 180)
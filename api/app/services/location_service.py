@@ -1,60 +1,148 @@
 import googlemaps
 import os
-from functools import lru_cache
 from itertools import islice
 from sqlalchemy.orm import Session
+from app.db.database import SessionLocal
+from app.services import quota, response_cache, route_fragments
 from app.models.geographic_area import GeographicArea
+from app.services.station_catalog import StationCatalog
+from app.services.station_snapshot import read_snapshot, seed_data_version, write_snapshot
+
+API_PATH = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+STATION_SNAPSHOT_PATH = os.getenv('STATION_SNAPSHOT_PATH', os.path.join(API_PATH, 'data', 'stations.snapshot'))
+# Snapshots built from other seed data are stale, so new station data in an image
+# reaches the database and the snapshot without deleting anything by hand
+STATION_DATA_VERSION = seed_data_version(os.path.join(API_PATH, 'scripts', 'seeds'))
+STATION_SNAPSHOT_MAX_AGE = float(os.getenv('STATION_SNAPSHOT_MAX_AGE')) if os.getenv('STATION_SNAPSHOT_MAX_AGE') else None
+# Durable copy of the snapshot (s3://bucket/key), fetched before the application starts
+STATION_SNAPSHOT_URL = os.getenv('STATION_SNAPSHOT_URL')
+# Number of straight-line nearest stations sent to the distance matrix. 25 keeps it
+# to a single call; 0 sends every candidate in the area.
+STATION_CANDIDATE_LIMIT = int(os.getenv('STATION_CANDIDATE_LIMIT', '25')) or None
+# Number of candidate stations when the distance matrix budget is nearly used up
+DEGRADED_CANDIDATE_LIMIT = int(os.getenv('GOOGLE_DEGRADED_CANDIDATE_LIMIT', '5'))
+GOOGLE_CACHE_ENABLED = os.getenv('GOOGLE_CACHE_ENABLED', 'true').lower() == 'true'
+# Suburban Station to the furthest station in the dataset, plus about a 20 minute walk
+SEPTA_AREA_RADIUS = 71000
+
+_station_catalog = None
+
+
+def build_stations_by_searchable_area(db: Session):
+    """
+    Break the stations down by categories based on geographic location. Only stations
+    in the matching category for the input will be used for the destination list in the
+    call to the distance matrix to keep costs down.
+    """
+    stations_by_searchable_area = {}
+
+    geographic_areas = db.query(GeographicArea).all()
+    for geographic_area in geographic_areas:
+        stations = []
+        for station_in_ga in geographic_area.stations:
+            station = station_in_ga.station
+            stations.append({
+                'Id': station.id,
+                'Line': station.line,
+                'Name': station.station_name,
+                'Latitude': station.latitude,
+                'Longitude': station.longitude,
+                'Address': station.address,
+                'City': station.city,
+                'State': station.state,
+                'Zip': station.zip,
+            })
+
+        stations_by_searchable_area[geographic_area.name] = stations
+
+    return stations_by_searchable_area
+
+
+def load_station_catalog(db: Session = None):
+    """
+    Cached station catalog. It is built on the first call and reused for subsequent
+    calls. The snapshot file is used when it exists, is fresh and was built from
+    the current seed data; otherwise the
+    stations are read from the database (opening a session if none is given) and
+    the snapshot is rewritten for the next cold start.
+    """
+    global _station_catalog
+    if _station_catalog is None:
+        stations_by_searchable_area = read_snapshot(
+            STATION_SNAPSHOT_PATH, STATION_SNAPSHOT_MAX_AGE, STATION_DATA_VERSION
+        )
+        if stations_by_searchable_area is None:
+            stations_by_searchable_area = _stations_by_searchable_area_from_db(db)
+            try:
+                write_snapshot(STATION_SNAPSHOT_PATH, stations_by_searchable_area, STATION_DATA_VERSION)
+            except OSError:
+                # A read-only filesystem only costs us the next cold start
+                pass
+        _station_catalog = StationCatalog(stations_by_searchable_area)
+    return _station_catalog
+
+
+def station_catalog_loaded():
+    """Whether the station catalog is already cached in this process."""
+    return _station_catalog is not None
+
+
+def _stations_by_searchable_area_from_db(db: Session = None):
+    if db is not None:
+        return build_stations_by_searchable_area(db)
+    db = SessionLocal()
+    try:
+        return build_stations_by_searchable_area(db)
+    finally:
+        db.close()
+
+
+def google_maps_client(cached=None):
+    """
+    Google Maps client whose calls are metered against the quota budgets and, when
+    cached (by default if GOOGLE_CACHE_ENABLED), go through the response cache.
+    GOOGLE_MAPS_BASE_URL points it at another server, ex: a local fake for tests.
+    """
+    if cached is None:
+        cached = GOOGLE_CACHE_ENABLED
+    kwargs = {'key': os.getenv('GOOGLE_API_KEY')}
+    if os.getenv('GOOGLE_MAPS_BASE_URL'):
+        kwargs['base_url'] = os.getenv('GOOGLE_MAPS_BASE_URL')
+    client = quota.MeteredClient(googlemaps.Client(**kwargs), quota.quota_tracker)
+    if cached:
+        # Cache hits aren't billed, so the cache sits in front of the metering
+        client = response_cache.CachedClient(client, response_cache.cache)
+    return client
+
 
 class LocationService():
-    def __init__(self, db: Session):
+    def __init__(self, db: Session = None):
         self.db = db
-        self.gmaps = googlemaps.Client(key=os.getenv('GOOGLE_API_KEY'))
-        self.stations_by_searchable_area = self.__get_stations_by_searchable_area()
+        self.gmaps = google_maps_client()
+        self.station_catalog = load_station_catalog(db)
+        self.stations_by_searchable_area = self.station_catalog.stations_by_searchable_area
+        # Walking distances in meters found by shortest_walk_in_area, by station id
+        self.walk_distances = {}
 
     ######    Private Methods    ######
 
-    @lru_cache(maxsize=1)
-    def __get_stations_by_searchable_area(self):
-        """
-        Cached version of stations by searchable area. The result will be cached after
-        the first call and reused for subsequent calls.
-        """
-        return self.__build_stations_by_searchable_area()
-
-    def __build_stations_by_searchable_area(self):
-        """
-        Break the stations down by categories based on geographic location. Only stations
-        in the matching category for the input will be used for the destination list in the
-        call to the distance matrix to keep costs down.
-        """
-        stations_by_searchable_area = {}
-
-        geographic_areas = self.db.query(GeographicArea).all()
-        for geographic_area in geographic_areas:
-            stations = []
-            for station_in_ga in geographic_area.stations:
-                station = station_in_ga.station
-                stations.append({
-                    'Line': station.line,
-                    'Name': station.station_name,
-                    'Latitude': station.latitude,
-                    'Longitude': station.longitude,
-                    'Address': station.address,
-                    'City': station.city,
-                    'State': station.state,
-                    'Zip': station.zip,
-                })
-
-            stations_by_searchable_area[geographic_area.name] = stations
-
-        return stations_by_searchable_area
-    
     def __chunked_iterable(self, iterable, size):
         """Yield successive chunks of a given size from an iterable."""
         it = iter(iterable)
         while chunk := list(islice(it, size)):
             yield chunk
 
+    def __direction_steps(self, directions):
+        """Instruction and distance of each step of a directions result's first route."""
+        if not directions:
+            return []
+        return [
+            {
+                'instruction': step['html_instructions'],
+                'distance': step['distance']['text'],
+            } for step in directions[0]['legs'][0]['steps']
+        ]
+
     def __station_coordinates(self, station):
         """Return the coordinates of a station as a tuple."""
         lat = station['Latitude']
@@ -64,6 +152,10 @@ class LocationService():
 
     ######    Public Methods    ######
 
+    def service_plan(self):
+        """How this request should degrade given the Google Maps usage so far."""
+        return quota.quota_tracker.plan(STATION_CANDIDATE_LIMIT, DEGRADED_CANDIDATE_LIMIT)
+
     def origin_geocode(self, location_type, origin):
         """
         Returns geocode result for a given origin.
@@ -81,6 +173,18 @@ class LocationService():
             }
             return self.gmaps.geocode(origin, bounds=bounds)
         
+    def origin_coordinates(self, location_type, origin, geocode_result):
+        """
+        Returns the origin as a (lat, lon) tuple. Coordinates are used as given;
+        addresses use the location of the geocode result.
+        """
+        if location_type == 'coordinates':
+            return origin
+        if not geocode_result:
+            return None
+        location = geocode_result[0]['geometry']['location']
+        return (location['lat'], location['lng'])
+
     def origin_within(self, geocode_result):
         """
         Extract state and county from geocode result
@@ -98,16 +202,33 @@ class LocationService():
             return state
         return county
         
-    def shortest_walk_in_area(self, location, matching_searchable_area):
+    def shortest_walk_in_area(
+        self, location, matching_searchable_area, line=None, exclude_stations=None,
+        origin_coordinates=None, candidate_limit=STATION_CANDIDATE_LIMIT,
+    ):
         """
-        Get the station with shortest walk to location. Break up stations
-        into chunks of 25 and call Google Maps Distance Matrix API to find
-        the shortest walk. 
+        Get the station with shortest walk to location. The area's stations are
+        narrowed by the optional line and excluded station filters using the
+        catalog indexes and, when the origin's coordinates are known, to the
+        straight-line nearest candidate_limit (all of them if it is None). The rest
+        are broken up into chunks of 25 for calls to the Google Maps Distance Matrix
+        API to find the shortest walk. A candidate_limit of 0 returns the
+        straight-line nearest station without calling the API. Returns None if no
+        station matches the filters.
         """
         # Initialize variables to track the closest destination
         closest_destination = None
         min_distance = 0
-        stations = self.stations_by_searchable_area[matching_searchable_area]
+        stations = self.station_catalog.candidates(
+            matching_searchable_area,
+            line=line,
+            exclude_stations=exclude_stations,
+        )
+        if origin_coordinates is not None:
+            if candidate_limit == 0:
+                nearest = self.station_catalog.rank(origin_coordinates, stations, 1)
+                return nearest[0] if nearest else None
+            stations = self.station_catalog.rank(origin_coordinates, stations, candidate_limit)
 
         # Process destinations in chunks of 25. This is the limit for the
         # distance matrix API.
@@ -126,24 +247,13 @@ class LocationService():
                         min_distance = distance
                         closest_destination = chunk[i]
 
+        if closest_destination is not None:
+            self.walk_distances[closest_destination['Id']] = min_distance
         return closest_destination
     
-    def station_to_geojson(self, station):
-        """Convert a station dictionary to GeoJSON Feature format"""
-        return {
-            "type": "Feature",
-            "geometry": {
-                "type": "Point",
-                "coordinates": [float(station['Longitude']), float(station['Latitude'])]
-            },
-            "properties": {
-                "name": station['Name'],
-                "address": station['Address'],
-                "city": station['City'],
-                "state": station['State'],
-                "zip": station['Zip']
-            }
-        }
+    def station_geojson(self, station):
+        """The station's GeoJSON Feature, pre-rendered to JSON when the catalog loaded."""
+        return self.station_catalog.geojson[station['Id']]
 
     def validate_origin_in_septa_area(self, origin):
         """
@@ -154,17 +264,13 @@ class LocationService():
         # This is the distance from Suburban Station to the furthest station in the
         # dataset, Newark, DE (69156), plus the distance in meters for around a 20
         # minute walk, which is a reasonable upper limit.
-        suburban_station = next(
-            station for station
-            in self.stations_by_searchable_area['Philadelphia']
-            if station['Name'] == 'Suburban Station'
-        )
+        suburban_station = self.station_catalog.station_named('Suburban Station')
         distance_from_suburban = self.gmaps.distance_matrix(
             self.__station_coordinates(suburban_station), origin
         )
         if distance_from_suburban['rows'][0]['elements'][0]['status'] == 'OK':
             distance = distance_from_suburban['rows'][0]['elements'][0]['distance']['value']
-            if distance > 71000:
+            if distance > SEPTA_AREA_RADIUS:
                 # Anything outside this limit is too far for a walk to any station
                 return f"Sorry, {origin} is too far from any stations to walk. Please try again."
         else:
@@ -174,20 +280,45 @@ class LocationService():
         
         return None
 
-    def walking_directions(self, origin, closest_station):
+    def validate_origin_by_straight_line(self, origin, origin_coordinates):
+        """
+        Like validate_origin_in_septa_area, but without a distance matrix call. The
+        straight-line distance never exceeds the walking distance, so this only
+        rejects origins that are certainly too far.
+        """
+        if origin_coordinates is None:
+            return f"Sorry, no viable route for walking can be found for {origin}. Please try again."
+        suburban_station = self.station_catalog.station_named('Suburban Station')
+        if self.station_catalog.distance_to(origin_coordinates, suburban_station) > SEPTA_AREA_RADIUS:
+            return f"Sorry, {origin} is too far from any stations to walk. Please try again."
+        return None
+
+    def walking_directions(self, origin, closest_station, origin_coordinates=None):
         """
-        This method will return walking directions to a given station.
+        This method will return walking directions to a given station. When a
+        precomputed approach to the station lies on the way, only the walk to its
+        entry point is routed and the approach is appended to it. Whether to stitch
+        is decided before routing, so this makes at most one Directions call.
         """
-        directions = self.gmaps.directions(
+        walk_distance = self.walk_distances.get(closest_station['Id'])
+        fragment = route_fragments.best_fragment(origin_coordinates, closest_station, walk_distance)
+        if fragment is not None:
+            if route_fragments.entry_distance(origin_coordinates, fragment) <= route_fragments.SNAP_DISTANCE:
+                return route_fragments.stitch([], fragment)
+            directions = self.gmaps.directions(
+                origin,
+                fragment.entry,
+                mode='walking',
+                units='imperial',
+            )
+            leading_steps = self.__direction_steps(directions)
+            if not leading_steps:
+                return []
+            return route_fragments.stitch(leading_steps, fragment)
+
+        return self.__direction_steps(self.gmaps.directions(
             origin,
             self.__station_coordinates(closest_station),
             mode='walking',
             units='imperial',
-        )
-        direction_steps = [
-            {
-                'instruction': step['html_instructions'],
-                'distance': step['distance']['text'],
-            } for step in directions[0]['legs'][0]['steps']
-        ]
-        return direction_steps
+        ))
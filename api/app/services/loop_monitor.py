@@ -0,0 +1,75 @@
+"""
+Event loop lag monitor.
+
+A task on the event loop records a heartbeat every interval. A watchdog thread
+checks the heartbeat and, when the loop has been stuck for longer than the
+threshold, logs the loop thread's current stack, which is the code blocking it.
+Once the loop gets going again, the total time it was blocked is logged too.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoopLagMonitor():
+    def __init__(self, threshold, interval=None):
+        self.threshold = threshold
+        self.interval = interval if interval is not None else threshold / 4
+        self.heartbeat = None
+        self.loop_thread_ident = None
+        self.task = None
+        self.watchdog = None
+        self.stopped = threading.Event()
+
+    ######    Private Methods    ######
+
+    async def __beat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            self.heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = time.monotonic() - expected
+            if lag > self.threshold:
+                logger.warning("Event loop was blocked for %.0f ms", lag * 1000)
+
+    def __watch(self):
+        reported = None
+        while not self.stopped.wait(self.interval):
+            heartbeat = self.heartbeat
+            if time.monotonic() - heartbeat <= self.threshold + self.interval:
+                continue
+            # Report each blockage once, while it is happening
+            if reported == heartbeat:
+                continue
+            reported = heartbeat
+            frame = sys._current_frames().get(self.loop_thread_ident)
+            stack = ''.join(traceback.format_stack(frame)) if frame is not None else 'unavailable'
+            logger.warning(
+                "Event loop blocked for more than %.0f ms, currently at:\n%s",
+                self.threshold * 1000, stack,
+            )
+
+    ######    Public Methods    ######
+
+    async def start(self):
+        """Start monitoring the running event loop."""
+        self.loop_thread_ident = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self.stopped.clear()
+        self.task = asyncio.get_running_loop().create_task(self.__beat())
+        self.watchdog = threading.Thread(target=self.__watch, name='event-loop-watchdog', daemon=True)
+        self.watchdog.start()
+
+    async def stop(self):
+        self.stopped.set()
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.watchdog.join()
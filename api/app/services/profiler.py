@@ -0,0 +1,89 @@
+"""
+Sampling profiler for the running worker.
+
+Every interval the stacks of all threads in the process are read with
+sys._current_frames() and counted. The result is written in the folded stack
+format ('frame;frame;frame count' per line) read by flamegraph.pl, speedscope and
+most other flamegraph tools.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_MODES = ('wall', 'cpu')
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    # ';' separates frames in the folded format
+    name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return name.replace(';', ':')
+
+
+def _folded_stack(thread_name, frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.append(thread_name.replace(';', ':'))
+    return ';'.join(reversed(names))
+
+
+def _running_thread_idents():
+    """
+    Idents of the threads the kernel has on a CPU (or ready to be) right now.
+    Returns None where /proc isn't available.
+    """
+    if not os.path.isdir('/proc/self/task'):
+        return None
+    running = set()
+    for thread in threading.enumerate():
+        try:
+            with open(f'/proc/self/task/{thread.native_id}/stat') as stat:
+                # The state follows the parenthesised command name
+                state = stat.read().rsplit(')', 1)[1].split()[0]
+        except (OSError, IndexError):
+            # The thread exited after it was listed, so it isn't running
+            continue
+        if state == 'R':
+            running.add(thread.ident)
+    return running
+
+
+class SamplingProfiler():
+    """
+    Samples every thread's stack. In 'wall' mode every sample of every thread is
+    counted, showing where time goes including waits; in 'cpu' mode only threads
+    that are running when sampled are counted (Linux only).
+    """
+    def __init__(self, interval=0.005, mode='wall'):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"mode must be one of {', '.join(PROFILE_MODES)}")
+        if mode == 'cpu' and _running_thread_idents() is None:
+            raise ValueError("cpu mode needs /proc, which isn't available here")
+        self.interval = interval
+        self.mode = mode
+        self.samples = Counter()
+
+    def sample(self):
+        """Take one sample of every thread but the profiler's own."""
+        own_ident = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        running = _running_thread_idents() if self.mode == 'cpu' else None
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident or (running is not None and ident not in running):
+                continue
+            self.samples[_folded_stack(names.get(ident, f'thread-{ident}'), frame)] += 1
+
+    def run(self, seconds):
+        """Sample for the given number of seconds and return the folded stacks."""
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            self.sample()
+            time.sleep(self.interval)
+        return self.folded()
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
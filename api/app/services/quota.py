@@ -0,0 +1,354 @@
+"""
+Accounting of billed Google Maps usage, with budgets and degradation.
+
+Google bills Geocoding and Directions per request and the Distance Matrix per
+element (origins x destinations). QuotaTracker counts billed units per call type
+in the current minute and UTC day, MeteredClient charges every call made through
+it and refuses calls that would go over a budget, and ServicePlan tells the
+request path how to degrade as the distance matrix and directions budgets run
+low.
+
+Minute counts are kept per worker process. Day counts are shared: each process
+periodically adds what it has charged to a store and loads the day's totals from
+every process back, so restarts, redeploys and extra tasks don't each get a fresh
+daily budget. Between syncs other processes' charges aren't seen, so a budget can
+be overshot by what the other processes charge in that time.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.dialects import postgresql, sqlite
+from app.db.database import SessionLocal
+from app.models.google_usage import GoogleUsage
+
+logger = logging.getLogger(__name__)
+
+CALL_TYPES = ('geocode', 'distance_matrix', 'directions')
+WINDOWS = {'minute': 60, 'day': 86400}
+# Days of usage kept in the store
+USAGE_RETENTION_DAYS = 7
+
+# Insert statements that can add to an existing row, by database dialect
+UPSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+class QuotaExceeded(Exception):
+    """Raised when a Google Maps call would go over its budget."""
+    def __init__(self, call_type, window):
+        self.call_type = call_type
+        self.window = window
+        super().__init__(f"Google Maps {call_type} budget for this {window} is exhausted")
+
+
+class DatabaseUsageStore():
+    """Keeps day usage in the google_usage table."""
+
+    def add_and_load(self, day, units):
+        """
+        Add units billed on a day, by call type, and return the day's totals by
+        call type. Usage older than USAGE_RETENTION_DAYS is deleted.
+        """
+        db = SessionLocal()
+        try:
+            insert = UPSERTS[db.get_bind().dialect.name]
+            for call_type, count in units.items():
+                db.execute(
+                    insert(GoogleUsage).values(call_type=call_type, day=day, used=count)
+                    .on_conflict_do_update(
+                        index_elements=['call_type', 'day'],
+                        set_={'used': GoogleUsage.used + count},
+                    )
+                )
+            db.query(GoogleUsage).filter(GoogleUsage.day < day - USAGE_RETENTION_DAYS).delete()
+            db.commit()
+            rows = db.query(GoogleUsage).filter(GoogleUsage.day == day).all()
+            return {row.call_type: row.used for row in rows}
+        finally:
+            db.close()
+
+
+class MemoryUsageStore():
+    """Day usage kept in memory, for tests."""
+
+    def __init__(self):
+        self.usage = {}
+
+    def add_and_load(self, day, units):
+        for call_type, count in units.items():
+            self.usage[(call_type, day)] = self.usage.get((call_type, day), 0) + count
+        return {
+            call_type: used for (call_type, used_day), used in self.usage.items() if used_day == day
+        }
+
+
+def _env_budget(name):
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+class QuotaTracker():
+    """
+    Billed units per call type in the current minute and day windows. A budget of
+    None means unlimited. With a store, day usage is synced with it at most every
+    sync_every seconds, in the background on the executor.
+    """
+    def __init__(
+        self, budgets=None, degrade_ratio=0.8, clock=time.time, store=None,
+        sync_every=10, executor=None,
+    ):
+        self.budgets = {
+            call_type: {window: None for window in WINDOWS} for call_type in CALL_TYPES
+        }
+        for call_type, windows in (budgets or {}).items():
+            self.budgets[call_type].update(windows)
+        self.degrade_ratio = degrade_ratio
+        self.clock = clock
+        self.store = store
+        self.sync_every = sync_every
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='quota-sync')
+        self.lock = threading.Lock()
+        # Held for a whole sync, so two syncs never add the same units
+        self.sync_lock = threading.Lock()
+        # (call type, window) -> (window number, units billed by this process)
+        self.counts = {}
+        # (day number, {call type: units}) of this process's usage already in the
+        # store, and of other processes' usage as of the last sync
+        self.synced = (None, {})
+        self.others = (None, {})
+        self.last_sync = None
+        self.syncing = False
+
+    @classmethod
+    def from_env(cls):
+        """
+        Budgets come from GOOGLE_<CALL TYPE>_BUDGET_PER_MINUTE and
+        GOOGLE_<CALL TYPE>_BUDGET_PER_DAY, ex: GOOGLE_DISTANCE_MATRIX_BUDGET_PER_DAY.
+        """
+        budgets = {
+            call_type: {
+                window: _env_budget(f'GOOGLE_{call_type.upper()}_BUDGET_PER_{window.upper()}')
+                for window in WINDOWS
+            } for call_type in CALL_TYPES
+        }
+        return cls(
+            budgets,
+            degrade_ratio=float(os.getenv('GOOGLE_BUDGET_DEGRADE_RATIO', '0.8')),
+            store=DatabaseUsageStore(),
+            sync_every=float(os.getenv('GOOGLE_USAGE_SYNC_SECONDS', '10')),
+        )
+
+    ######    Private Methods    ######
+
+    def __window_number(self, window):
+        return int(self.clock() // WINDOWS[window])
+
+    def __used_here(self, call_type, window):
+        window_number, used = self.counts.get((call_type, window), (None, 0))
+        return used if window_number == self.__window_number(window) else 0
+
+    def __used(self, call_type, window):
+        used = self.__used_here(call_type, window)
+        day, others = self.others
+        if window == 'day' and day == self.__window_number('day'):
+            used += others.get(call_type, 0)
+        return used
+
+    def __sync_due(self):
+        if self.store is None or self.syncing:
+            return False
+        return self.last_sync is None or self.clock() - self.last_sync >= self.sync_every
+
+    def __sync_logging_errors(self):
+        try:
+            self.sync()
+        except Exception:
+            logger.exception("Syncing Google Maps usage failed")
+
+    ######    Public Methods    ######
+
+    def charge(self, call_type, units=1):
+        """
+        Record units billed for a call, or raise QuotaExceeded without recording
+        anything if that would go over a budget.
+        """
+        with self.lock:
+            for window in WINDOWS:
+                budget = self.budgets[call_type][window]
+                if budget is not None and self.__used(call_type, window) + units > budget:
+                    raise QuotaExceeded(call_type, window)
+            for window in WINDOWS:
+                used = self.__used_here(call_type, window)
+                self.counts[(call_type, window)] = (self.__window_number(window), used + units)
+            sync = self.__sync_due()
+            if sync:
+                self.syncing = True
+        if sync:
+            try:
+                self.executor.submit(self.__sync_logging_errors)
+            except RuntimeError:
+                # The executor has been shut down
+                self.syncing = False
+
+    def sync(self):
+        """
+        Add this process's day usage since the last sync to the store, and load the
+        day's usage by other processes from it.
+        """
+        if self.store is None:
+            return
+        with self.sync_lock:
+            with self.lock:
+                self.syncing = True
+                self.last_sync = self.clock()
+                day = self.__window_number('day')
+                used_here = {call_type: self.__used_here(call_type, 'day') for call_type in CALL_TYPES}
+                synced_day, synced = self.synced
+                if synced_day != day:
+                    synced = {}
+                units = {
+                    call_type: used - synced.get(call_type, 0)
+                    for call_type, used in used_here.items() if used > synced.get(call_type, 0)
+                }
+            try:
+                totals = self.store.add_and_load(day, units)
+                with self.lock:
+                    self.synced = (day, used_here)
+                    self.others = (day, {
+                        call_type: max(totals.get(call_type, 0) - used, 0)
+                        for call_type, used in used_here.items()
+                    })
+            finally:
+                with self.lock:
+                    self.syncing = False
+
+    def shutdown(self):
+        """Sync usage a last time and wait for it to finish."""
+        try:
+            self.executor.submit(self.__sync_logging_errors)
+        except RuntimeError:
+            pass
+        self.executor.shutdown(wait=True)
+
+    def usage(self):
+        """Billed units and budgets per call type and window."""
+        with self.lock:
+            return {
+                call_type: {
+                    window: {
+                        'used': self.__used(call_type, window),
+                        'budget': self.budgets[call_type][window],
+                    } for window in WINDOWS
+                } for call_type in CALL_TYPES
+            }
+
+    def utilization(self, call_type):
+        """The highest fraction of any of a call type's budgets used so far."""
+        with self.lock:
+            ratios = [0.0]
+            for window, budget in self.budgets[call_type].items():
+                if budget == 0:
+                    # A zero budget disables the call type entirely
+                    ratios.append(1.0)
+                elif budget is not None:
+                    ratios.append(self.__used(call_type, window) / budget)
+            return max(ratios)
+
+    def plan(self, candidate_limit, degraded_candidate_limit):
+        """How the next request should degrade, given usage so far."""
+        return ServicePlan(
+            self.utilization('distance_matrix'),
+            self.utilization('directions'),
+            self.degrade_ratio,
+            candidate_limit,
+            degraded_candidate_limit,
+        )
+
+
+class ServicePlan():
+    """
+    What a request may spend. Near the distance matrix budget, fewer candidate
+    stations are sent and the origin is checked by straight-line distance instead
+    of a distance matrix call; once it is used up, the straight-line nearest station
+    is returned. Walking directions are left out once their budget is used up.
+    """
+    def __init__(
+        self, matrix_utilization, directions_utilization, degrade_ratio,
+        candidate_limit, degraded_candidate_limit,
+    ):
+        self.reasons = []
+        self.validate_with_distance_matrix = matrix_utilization < degrade_ratio
+        self.candidate_limit = candidate_limit
+        self.include_directions = True
+        if matrix_utilization >= 1:
+            self.candidate_limit = 0
+            self.reasons.append(
+                'Distance matrix budget exhausted: nearest station by straight-line distance'
+            )
+        elif matrix_utilization >= degrade_ratio:
+            self.candidate_limit = degraded_candidate_limit
+            self.reasons.append(
+                'Distance matrix budget nearly exhausted: fewer stations compared by walking distance'
+            )
+        if directions_utilization >= 1:
+            self.omit_directions()
+
+    def omit_directions(self):
+        """Leave out walking directions, ex: when their budget runs out mid-request."""
+        self.include_directions = False
+        self.reasons.append('Directions budget exhausted: walking directions omitted')
+
+    @property
+    def level(self):
+        if not self.reasons:
+            return 'full'
+        if self.candidate_limit == 0 or not self.include_directions:
+            return 'minimal'
+        return 'reduced'
+
+    @property
+    def straight_line_only(self):
+        return self.candidate_limit == 0
+
+    def as_response(self):
+        """Degradation details for the response, or None when nothing was degraded."""
+        if not self.reasons:
+            return None
+        return {'level': self.level, 'reasons': self.reasons}
+
+
+def _location_count(locations):
+    # googlemaps accepts a single location (address, (lat, lng) tuple or dict) or a list of them
+    return len(locations) if isinstance(locations, list) else 1
+
+
+class MeteredClient():
+    """
+    Wraps a googlemaps.Client, charging each call to a QuotaTracker before it is
+    made. Calls that would go over budget raise QuotaExceeded instead.
+    """
+    def __init__(self, client, tracker):
+        self.client = client
+        self.tracker = tracker
+
+    def geocode(self, *args, **kwargs):
+        self.tracker.charge('geocode')
+        return self.client.geocode(*args, **kwargs)
+
+    def reverse_geocode(self, *args, **kwargs):
+        self.tracker.charge('geocode')
+        return self.client.reverse_geocode(*args, **kwargs)
+
+    def distance_matrix(self, origins, destinations, *args, **kwargs):
+        self.tracker.charge(
+            'distance_matrix', _location_count(origins) * _location_count(destinations)
+        )
+        return self.client.distance_matrix(origins, destinations, *args, **kwargs)
+
+    def directions(self, *args, **kwargs):
+        self.tracker.charge('directions')
+        return self.client.directions(*args, **kwargs)
+
+
+quota_tracker = QuotaTracker.from_env()
@@ -0,0 +1,316 @@
+"""
+Stale-while-revalidate cache of Google Maps responses, persisted across restarts.
+
+Responses are served from memory. An entry younger than the fresh TTL is served
+as is; one past it but younger than the stale TTL is served while a background
+thread fetches a replacement; anything older is fetched before responding,
+unless the fetch fails (ex: it is refused for being over budget), when the old
+response is served anyway. New and refreshed responses, and hit counts, are written to the
+store in the background, so the request path never waits on it. At startup the
+most requested entries younger than the stale TTL are loaded back from the
+store, and older ones are deleted from it then and periodically after.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from app.db.database import SessionLocal
+from app.models.google_response import GoogleResponse
+from app.services.quota import UPSERTS, QuotaExceeded
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(call_type, args, kwargs):
+    """Stable key for a call, from its type and arguments."""
+    request = json.dumps([call_type, args, kwargs], sort_keys=True, default=str)
+    return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+
+class CacheEntry():
+    def __init__(self, key, call_type, response, fetched_at, hit_count=0):
+        self.key = key
+        self.call_type = call_type
+        self.response = response
+        self.fetched_at = fetched_at
+        self.hit_count = hit_count
+
+
+class DatabaseResponseStore():
+    """Keeps cache entries in the google_responses table."""
+
+    def load_popular(self, limit, fetched_since):
+        """The most requested entries fetched since a time, most requested first."""
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(GoogleResponse)
+                .filter(GoogleResponse.fetched_at >= fetched_since)
+                .order_by(GoogleResponse.hit_count.desc())
+                .limit(limit)
+                .all()
+            )
+            return [
+                CacheEntry(row.key, row.call_type, json.loads(row.response), row.fetched_at, row.hit_count)
+                for row in rows
+            ]
+        finally:
+            db.close()
+
+    def save(self, entry):
+        """
+        Insert or replace an entry's response, keeping its hit count. This is a
+        single upsert, so processes saving the same new entry at once don't conflict.
+        """
+        db = SessionLocal()
+        try:
+            insert = UPSERTS[db.get_bind().dialect.name]
+            response = json.dumps(entry.response)
+            db.execute(
+                insert(GoogleResponse).values(
+                    key=entry.key, call_type=entry.call_type, response=response,
+                    fetched_at=entry.fetched_at, hit_count=0,
+                )
+                .on_conflict_do_update(
+                    index_elements=['key'],
+                    set_={'response': response, 'fetched_at': entry.fetched_at},
+                )
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def add_hits(self, hits, hit_at):
+        """Add to the hit counts of entries, by key."""
+        db = SessionLocal()
+        try:
+            for key, count in hits.items():
+                db.query(GoogleResponse).filter(GoogleResponse.key == key).update({
+                    GoogleResponse.hit_count: GoogleResponse.hit_count + count,
+                    GoogleResponse.last_hit_at: hit_at,
+                })
+            db.commit()
+        finally:
+            db.close()
+
+    def prune(self, fetched_before):
+        """Delete entries fetched before a time. Returns the number deleted."""
+        db = SessionLocal()
+        try:
+            deleted = db.query(GoogleResponse).filter(GoogleResponse.fetched_at < fetched_before).delete()
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+
+class MemoryResponseStore():
+    """Cache entries kept in memory, for tests."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def load_popular(self, limit, fetched_since):
+        entries = [entry for entry in self.entries.values() if entry.fetched_at >= fetched_since]
+        return sorted(entries, key=lambda entry: entry.hit_count, reverse=True)[:limit]
+
+    def save(self, entry):
+        hit_count = self.entries[entry.key].hit_count if entry.key in self.entries else 0
+        self.entries[entry.key] = CacheEntry(
+            entry.key, entry.call_type, entry.response, entry.fetched_at, hit_count
+        )
+
+    def add_hits(self, hits, hit_at):
+        for key, count in hits.items():
+            if key in self.entries:
+                self.entries[key].hit_count += count
+
+    def prune(self, fetched_before):
+        expired = [key for key, entry in self.entries.items() if entry.fetched_at < fetched_before]
+        for key in expired:
+            del self.entries[key]
+        return len(expired)
+
+
+class ResponseCache():
+    """
+    In-memory entries, least recently used evicted first, backed by a store.
+    Background work (refreshes and store writes) runs on the executor. Entries
+    past the stale TTL are pruned from the store at most every prune_every seconds,
+    when hit counts are flushed.
+    """
+    def __init__(
+        self, store, fresh_ttl=86400, stale_ttl=604800, max_entries=10000,
+        flush_every=100, prune_every=3600, clock=time.time, executor=None,
+    ):
+        self.store = store
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self.prune_every = prune_every
+        self.last_prune = None
+        self.clock = clock
+        self.executor = executor or ThreadPoolExecutor(max_workers=2, thread_name_prefix='response-cache')
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.refreshing = set()
+        self.pending_hits = {}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            DatabaseResponseStore(),
+            fresh_ttl=float(os.getenv('GOOGLE_CACHE_FRESH_SECONDS', '86400')),
+            stale_ttl=float(os.getenv('GOOGLE_CACHE_STALE_SECONDS', '604800')),
+            max_entries=int(os.getenv('GOOGLE_CACHE_MAX_ENTRIES', '10000')),
+        )
+
+    ######    Private Methods    ######
+
+    def __remember(self, entry):
+        with self.lock:
+            self.entries[entry.key] = entry
+            self.entries.move_to_end(entry.key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __fetch(self, key, call_type, fetch):
+        entry = CacheEntry(key, call_type, fetch(), self.clock())
+        with self.lock:
+            previous = self.entries.get(key)
+            if previous is not None:
+                entry.hit_count = previous.hit_count
+        self.__remember(entry)
+        self.__in_background(self.store.save, entry)
+        return entry
+
+    def __refresh(self, key, call_type, fetch):
+        try:
+            self.__fetch(key, call_type, fetch)
+        except Exception:
+            logger.exception("Refreshing cached Google %s response failed", call_type)
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def __in_background(self, function, *args):
+        def run():
+            try:
+                function(*args)
+            except Exception:
+                logger.exception("Persisting Google response cache failed")
+        try:
+            self.executor.submit(run)
+        except RuntimeError:
+            # The executor has been shut down
+            pass
+
+    ######    Public Methods    ######
+
+    def get(self, call_type, args, kwargs, fetch):
+        """
+        The response for a call, fetching it with fetch() when there is no usable
+        cached response.
+        """
+        key = cache_key(call_type, args, kwargs)
+        now = self.clock()
+        expired = None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                age = now - entry.fetched_at
+                if age < self.stale_ttl:
+                    self.entries.move_to_end(key)
+                    entry.hit_count += 1
+                    self.pending_hits[key] = self.pending_hits.get(key, 0) + 1
+                    refresh = age >= self.fresh_ttl and key not in self.refreshing
+                    if refresh:
+                        self.refreshing.add(key)
+                    flush = sum(self.pending_hits.values()) >= self.flush_every
+                else:
+                    expired, entry = entry, None
+
+        if entry is None:
+            try:
+                return self.__fetch(key, call_type, fetch).response
+            except QuotaExceeded:
+                if expired is None:
+                    raise
+                logger.warning("Serving an expired Google %s response, the budget is used up", call_type)
+                return expired.response
+            except Exception:
+                if expired is None:
+                    raise
+                logger.exception("Serving an expired Google %s response, fetching it again failed", call_type)
+                return expired.response
+        if refresh:
+            self.__in_background(self.__refresh, key, call_type, fetch)
+        if flush:
+            self.__in_background(self.flush_hits)
+        return entry.response
+
+    def flush_hits(self):
+        """Write hit counts gathered since the last flush to the store."""
+        with self.lock:
+            hits, self.pending_hits = self.pending_hits, {}
+        if hits:
+            self.store.add_hits(hits, self.clock())
+        if self.last_prune is None or self.clock() - self.last_prune >= self.prune_every:
+            self.prune()
+
+    def prune(self):
+        """Delete entries past the stale TTL from the store."""
+        self.last_prune = self.clock()
+        return self.store.prune(self.last_prune - self.stale_ttl)
+
+    def warm_up(self, limit=None):
+        """
+        Delete entries past the stale TTL from the store, then load the most
+        requested of the rest into memory.
+        """
+        limit = self.max_entries if limit is None else limit
+        self.prune()
+        entries = self.store.load_popular(limit, self.clock() - self.stale_ttl)
+        # Least requested first, so the most requested are the last to be evicted
+        for entry in reversed(entries):
+            self.__remember(entry)
+        return len(entries)
+
+    def shutdown(self):
+        """Flush hit counts and wait for background writes to finish."""
+        self.__in_background(self.flush_hits)
+        self.executor.shutdown(wait=True)
+
+
+class CachedClient():
+    """
+    Wraps a Google Maps client so geocode, distance matrix and directions calls go
+    through a ResponseCache.
+    """
+    def __init__(self, client, cache):
+        self.client = client
+        self.cache = cache
+
+    def __cached(self, call_type, *args, **kwargs):
+        method = getattr(self.client, call_type)
+        return self.cache.get(call_type, args, kwargs, lambda: method(*args, **kwargs))
+
+    def geocode(self, *args, **kwargs):
+        return self.__cached('geocode', *args, **kwargs)
+
+    def reverse_geocode(self, *args, **kwargs):
+        return self.__cached('reverse_geocode', *args, **kwargs)
+
+    def distance_matrix(self, *args, **kwargs):
+        return self.__cached('distance_matrix', *args, **kwargs)
+
+    def directions(self, *args, **kwargs):
+        return self.__cached('directions', *args, **kwargs)
+
+
+cache = ResponseCache.from_env()
@@ -0,0 +1,128 @@
+"""
+Precomputed station approach routes.
+
+Most walks to a station end with the same final approach, so walking routes from
+a ring of entry points around each station to the station are computed ahead of
+time (see scripts/precompute_station_approaches.py) and kept in the
+station_approach_routes table. Directions for a request can then be built by
+routing only from the origin to the best entry point and appending the stored
+approach. An entry point is where Google starts the walking route from a point
+on the ring, so it is on a walkable street and the two parts meet. When no entry
+point lies reasonably on the way, or the stitched walk would likely be much
+longer than the walk to the station, the caller routes the whole walk instead.
+Either way a request makes at most one Directions call.
+"""
+import json
+import os
+import re
+from sqlalchemy.orm import Session
+from app.db.database import SessionLocal
+from app.models.station_approach_route import StationApproachRoute
+from app.services.geo import haversine
+
+# Origins this much closer than the ring to the station are routed in full
+INSIDE_RING_FACTOR = 1.25
+# Only stitch when going via the entry point adds at most this much to the walk
+MAX_DETOUR = float(os.getenv('ROUTE_FRAGMENT_MAX_DETOUR', '1.15'))
+# Origins this close to an entry point use the stored approach without routing
+SNAP_DISTANCE = float(os.getenv('ROUTE_FRAGMENT_SNAP_METERS', '25'))
+# Walks are about this much longer than the straight line, for estimating the
+# walk to an entry point before it is routed
+WALKING_FACTOR = float(os.getenv('ROUTE_FRAGMENT_WALKING_FACTOR', '1.25'))
+
+# Google puts 'Destination will be on the left' etc. on the last step of a leg
+DESTINATION_NOTE = re.compile(r'<div[^>]*>\s*Destination will be[^<]*</div>\s*$')
+
+_route_fragments = {}
+
+
+class RouteFragment():
+    def __init__(self, station_id, entry, radius, steps, distance):
+        self.station_id = station_id
+        self.entry = entry
+        self.radius = radius
+        self.steps = steps
+        # Walking distance of the approach in meters
+        self.distance = distance
+
+
+def load_route_fragments(db: Session = None):
+    """
+    Load the precomputed approach routes into memory, grouped by station id.
+    Returns the number loaded.
+    """
+    global _route_fragments
+    close = db is None
+    if db is None:
+        db = SessionLocal()
+    try:
+        route_fragments = {}
+        for route in db.query(StationApproachRoute).all():
+            route_fragments.setdefault(route.station_id, []).append(RouteFragment(
+                route.station_id,
+                (route.entry_latitude, route.entry_longitude),
+                route.radius,
+                json.loads(route.steps),
+                route.distance,
+            ))
+    finally:
+        if close:
+            db.close()
+    _route_fragments = route_fragments
+    return sum(len(fragments) for fragments in route_fragments.values())
+
+
+def best_fragment(origin_coordinates, station, walk_distance=None):
+    """
+    The approach route to stitch onto a walk from the origin to the station, or
+    None when the whole walk should be routed instead. walk_distance is the walking
+    distance to the station in meters, when known.
+    """
+    fragments = _route_fragments.get(station['Id'])
+    if not fragments or origin_coordinates is None:
+        return None
+
+    station_coordinates = ([station['Latitude']], [station['Longitude']])
+    direct = float(haversine(origin_coordinates, *station_coordinates)[0])
+    best, best_detour = None, None
+    for fragment in fragments:
+        to_entry = entry_distance(origin_coordinates, fragment)
+        if not fits_walk(to_entry * WALKING_FACTOR, fragment, walk_distance):
+            continue
+        if to_entry <= SNAP_DISTANCE:
+            return fragment
+        if direct <= fragment.radius * INSIDE_RING_FACTOR:
+            continue
+        entry_to_station = float(haversine(fragment.entry, *station_coordinates)[0])
+        detour = (to_entry + entry_to_station) / direct
+        if detour <= MAX_DETOUR and (best_detour is None or detour < best_detour):
+            best, best_detour = fragment, detour
+    return best
+
+
+def fits_walk(leading_distance, fragment, walk_distance):
+    """
+    Whether a walk of leading_distance meters to the entry point followed by the
+    approach is at most MAX_DETOUR times walk_distance. Always true when the walk
+    to the station isn't known.
+    """
+    if walk_distance is None:
+        return True
+    return leading_distance + fragment.distance <= walk_distance * MAX_DETOUR
+
+
+def entry_distance(origin_coordinates, fragment):
+    """Straight-line distance in meters from the origin to a fragment's entry point."""
+    return float(haversine(origin_coordinates, [fragment.entry[0]], [fragment.entry[1]])[0])
+
+
+def stitch(leading_steps, fragment):
+    """
+    Directions steps for the walk to the entry point followed by the approach. The
+    note that the destination has been reached is dropped from the first part,
+    since the walk carries on.
+    """
+    steps = [dict(step) for step in leading_steps]
+    if steps:
+        steps[-1]['instruction'] = DESTINATION_NOTE.sub('', steps[-1]['instruction'])
+    return steps + [dict(step) for step in fragment.steps]
@@ -0,0 +1,226 @@
+import hashlib
+import numpy as np
+import orjson
+from collections import defaultdict
+from app.responses import PrerenderedJSON
+from app.services.geo import haversine, haversine_matrix, nearest
+
+
+def normalize_key(value):
+    """Normalize an index key so lookups ignore case and surrounding whitespace."""
+    if value is None:
+        return None
+    return ' '.join(str(value).split()).lower()
+
+
+def normalize_line(value):
+    """
+    Normalize a line name. The seeded data names lines like 'Paoli Thorndale Line',
+    while requests may say 'Paoli/Thorndale' or 'paoli-thorndale line', so '/' and
+    '-' count as spaces and a trailing 'line' is dropped.
+    """
+    if value is None:
+        return None
+    key = normalize_key(str(value).replace('/', ' ').replace('-', ' '))
+    if key.endswith(' line'):
+        key = key[:-len(' line')]
+    return key
+
+
+# Stations on the shared trunks are seeded with the line 'Joint' rather than the
+# lines that stop there
+JOINT_LINE = 'joint'
+ALL_LINES = (
+    'Airport', 'Chestnut Hill East', 'Chestnut Hill West', 'Cynwyd', 'Fox Chase',
+    'Lansdale Doylestown', 'Manayunk Norristown', 'Media Elwyn', 'Paoli Thorndale',
+    'Trenton', 'Warminster', 'West Trenton', 'Wilmington Newark',
+)
+NORTHEAST_TRUNK_LINES = ('Lansdale Doylestown', 'Warminster', 'West Trenton')
+JOINT_STATION_LINES = {
+    '30th street station': ALL_LINES,
+    'suburban station': ALL_LINES,
+    'jefferson': ALL_LINES,
+    'temple university': ALL_LINES,
+    'university city': ('Airport', 'Media Elwyn', 'Wilmington Newark'),
+    'north broad': NORTHEAST_TRUNK_LINES,
+    'wayne junction': NORTHEAST_TRUNK_LINES + ('Chestnut Hill East', 'Fox Chase'),
+    'fern rock t.c.': NORTHEAST_TRUNK_LINES,
+    'melrose park': NORTHEAST_TRUNK_LINES,
+    'elkins park': NORTHEAST_TRUNK_LINES,
+    'jenkintown wyncote': NORTHEAST_TRUNK_LINES,
+    'glenside': ('Lansdale Doylestown', 'Warminster'),
+}
+
+
+def station_lines(station):
+    """
+    The normalized lines serving a station, or None for a 'Joint' station whose
+    lines aren't known, which is then taken to be on every line.
+    """
+    line = normalize_line(station['Line'])
+    if line != JOINT_LINE:
+        return [line]
+    lines = JOINT_STATION_LINES.get(normalize_line(station['Name']))
+    if lines is None:
+        return None
+    return [normalize_line(line) for line in lines]
+
+
+def station_feature(station):
+    """Convert a station dictionary to GeoJSON Feature format"""
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [float(station['Longitude']), float(station['Latitude'])]
+        },
+        "properties": {
+            "name": station['Name'],
+            "address": station['Address'],
+            "city": station['City'],
+            "state": station['State'],
+            "zip": station['Zip']
+        }
+    }
+
+
+class StationCatalog():
+    """
+    Station data grouped by searchable area, plus inverted indexes over it. The
+    indexes map a normalized line, station name, ZIP or area name to the set of
+    station ids that match, so request filters can be answered by set
+    intersection instead of scanning the area lists. Station coordinates are
+    also kept in contiguous arrays, in id order, for vectorized distance
+    calculations, and each station's GeoJSON Feature is rendered to JSON bytes
+    once so responses don't rebuild it.
+    """
+    def __init__(self, stations_by_searchable_area):
+        self.stations_by_searchable_area = stations_by_searchable_area
+        self.stations = {}
+        self.by_area = defaultdict(set)
+        self.by_line = defaultdict(set)
+        self.on_every_line = set()
+        self.by_name = defaultdict(set)
+        self.by_zip = defaultdict(set)
+
+        for area, stations in stations_by_searchable_area.items():
+            for station in stations:
+                station_id = station['Id']
+                # The same station can be listed in several areas, so keep one
+                # canonical entry per id.
+                self.stations.setdefault(station_id, station)
+                self.by_area[area].add(station_id)
+                lines = station_lines(station)
+                if lines is None:
+                    self.on_every_line.add(station_id)
+                for line in lines or []:
+                    self.by_line[line].add(station_id)
+                self.by_name[normalize_key(station['Name'])].add(station_id)
+                self.by_zip[normalize_key(station['Zip'])].add(station_id)
+
+        self.station_ids = np.array(sorted(self.stations), dtype=np.int64)
+        self.row_by_id = {station_id: row for row, station_id in enumerate(self.station_ids.tolist())}
+        self.latitudes = np.ascontiguousarray(
+            [float(self.stations[station_id]['Latitude']) for station_id in self.station_ids.tolist()],
+            dtype=np.float64,
+        )
+        self.longitudes = np.ascontiguousarray(
+            [float(self.stations[station_id]['Longitude']) for station_id in self.station_ids.tolist()],
+            dtype=np.float64,
+        )
+
+        self.geojson = {
+            station_id: PrerenderedJSON(orjson.dumps(station_feature(self.stations[station_id])))
+            for station_id in self.station_ids.tolist()
+        }
+        self.feature_collection = PrerenderedJSON(
+            b'{"type":"FeatureCollection","features":['
+            + b','.join(self.geojson[station_id] for station_id in self.station_ids.tolist())
+            + b']}'
+        )
+        self.etag = f'"{hashlib.sha256(self.feature_collection).hexdigest()[:32]}"'
+
+    ######    Private Methods    ######
+
+    def __ordered(self, station_ids):
+        """Return the stations for a set of ids, in id order."""
+        return [self.stations[station_id] for station_id in sorted(station_ids)]
+
+    def __on_line(self, line):
+        """Return the ids of the stations served by a line."""
+        return self.by_line.get(normalize_line(line), set()) | self.on_every_line
+
+
+    ######    Public Methods    ######
+
+    def station_named(self, name):
+        """Return the station with the given name, or None if there isn't one."""
+        station_ids = self.by_name.get(normalize_key(name))
+        if not station_ids:
+            return None
+        return self.stations[min(station_ids)]
+
+    def stations_on_line(self, line):
+        """Return the stations on the given line."""
+        return self.__ordered(self.__on_line(line))
+
+    def stations_in_zip(self, zip_code):
+        """Return the stations in the given ZIP code."""
+        return self.__ordered(self.by_zip.get(normalize_key(zip_code), set()))
+
+    def candidates(self, area, line=None, exclude_stations=None, zip_code=None):
+        """
+        Return the stations in an area that satisfy the optional request filters.
+        The area's station order is preserved so results stay deterministic. An area
+        of None searches every station.
+        """
+        if area is None:
+            station_ids = set(self.stations)
+        else:
+            station_ids = set(self.by_area.get(area, set()))
+        if line is not None:
+            station_ids &= self.__on_line(line)
+        if zip_code is not None:
+            station_ids &= self.by_zip.get(normalize_key(zip_code), set())
+        for name in exclude_stations or []:
+            station_ids -= self.by_name.get(normalize_key(name), set())
+
+        if area is None:
+            return self.__ordered(station_ids)
+        return [
+            station for station in self.stations_by_searchable_area.get(area, [])
+            if station['Id'] in station_ids
+        ]
+
+    def distances_from(self, origins):
+        """
+        Straight-line distances in meters from a batch of (lat, lon) origins to every
+        station. Rows follow the order of origins, columns follow station_ids.
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+        return haversine_matrix(origins[:, 0], origins[:, 1], self.latitudes, self.longitudes)
+
+    def distance_to(self, origin, station):
+        """Straight-line distance in meters from a (lat, lon) origin to a station."""
+        row = self.row_by_id[station['Id']]
+        return float(haversine(origin, self.latitudes[row:row + 1], self.longitudes[row:row + 1])[0])
+
+    def rank(self, origin, stations, limit=None):
+        """
+        Order stations by straight-line distance from a (lat, lon) origin, nearest
+        first, keeping at most limit of them.
+        """
+        if not stations:
+            return []
+        rows = np.fromiter((self.row_by_id[station['Id']] for station in stations), dtype=np.int64)
+        distances = haversine(origin, self.latitudes[rows], self.longitudes[rows])
+        return [stations[i] for i in nearest(distances, limit)[0].tolist()]
+
+    def nearest_stations(self, origins, limit=1):
+        """
+        The nearest stations to each of a batch of (lat, lon) origins. Returns a list
+        per origin, nearest first.
+        """
+        order = nearest(self.distances_from(origins), limit)
+        station_ids = self.station_ids[order].tolist()
+        return [[self.stations[station_id] for station_id in row] for row in station_ids]
@@ -0,0 +1,246 @@
+"""
+Compact columnar snapshot of the station catalog.
+
+The snapshot lets a worker build its station catalog at startup without a
+database round trip. The file layout is:
+
+    magic (8 bytes) | format version (uint32) | header length (uint32)
+    header (UTF-8 JSON: created_at, data version, string table, record counts)
+    station records (fixed width, 8-byte aligned)
+    area membership records (fixed width, 8-byte aligned)
+
+Station records hold coordinates as float64 and every text field as an index
+into the header's string table. Area memberships are (area, station row) pairs,
+with the area name also stored in the string table. Both record blocks are
+memory-mapped when the snapshot is read.
+
+The data version is a hash of the seed data and scripts the stations came from,
+so a snapshot exported before the seeds changed is treated as stale.
+
+Container storage doesn't outlive a task, so a copy of the snapshot can also be
+kept in S3, uploaded after the station data is exported and downloaded before
+the application starts.
+"""
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import time
+from urllib.parse import urlparse
+import numpy as np
+
+SNAPSHOT_MAGIC = b'SEPTACAT'
+SNAPSHOT_FORMAT_VERSION = 1
+
+PREAMBLE = struct.Struct('<8sII')
+
+STATION_DTYPE = np.dtype([
+    ('latitude', '<f8'),
+    ('longitude', '<f8'),
+    ('id', '<i4'),
+    ('line', '<u4'),
+    ('name', '<u4'),
+    ('address', '<u4'),
+    ('city', '<u4'),
+    ('state', '<u4'),
+    ('zip', '<u4'),
+])
+
+MEMBERSHIP_DTYPE = np.dtype([
+    ('area', '<u4'),
+    ('station', '<u4'),
+])
+
+# Station dict keys stored in the string table, by record field
+TEXT_FIELDS = {
+    'line': 'Line',
+    'name': 'Name',
+    'address': 'Address',
+    'city': 'City',
+    'state': 'State',
+    'zip': 'Zip',
+}
+
+
+def _aligned(offset, alignment=8):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def seed_data_version(seeds_path):
+    """
+    A hash of the files in the seeds directory, which the station data is built
+    from. Returns None if the directory doesn't exist.
+    """
+    if not os.path.isdir(seeds_path):
+        return None
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(seeds_path)):
+        file_path = os.path.join(seeds_path, name)
+        if not os.path.isfile(file_path):
+            continue
+        digest.update(name.encode('utf-8') + b'\0')
+        with open(file_path, 'rb') as seed_file:
+            digest.update(hashlib.sha256(seed_file.read()).digest())
+    return digest.hexdigest()
+
+
+def write_snapshot(path, stations_by_searchable_area, data_version=None):
+    """
+    Write stations by searchable area to a snapshot file, tagged with the data
+    version of the seeds they came from. The file is written to a temporary file
+    of its own first and then moved into place, so readers never see a partial
+    snapshot, even with several processes writing at once.
+    """
+    strings = []
+    string_index = {}
+
+    def intern(value):
+        value = '' if value is None else str(value)
+        if value not in string_index:
+            string_index[value] = len(strings)
+            strings.append(value)
+        return string_index[value]
+
+    rows = {}
+    memberships = []
+    for area, stations in stations_by_searchable_area.items():
+        area_index = intern(area)
+        for station in stations:
+            if station['Id'] not in rows:
+                rows[station['Id']] = (len(rows), station)
+            memberships.append((area_index, rows[station['Id']][0]))
+
+    station_records = np.zeros(len(rows), dtype=STATION_DTYPE)
+    for row, station in rows.values():
+        record = station_records[row]
+        record['latitude'] = float(station['Latitude'])
+        record['longitude'] = float(station['Longitude'])
+        record['id'] = station['Id']
+        for field, key in TEXT_FIELDS.items():
+            record[field] = intern(station[key])
+    membership_records = np.array(memberships, dtype=MEMBERSHIP_DTYPE)
+
+    header = json.dumps({
+        'created_at': time.time(),
+        'data_version': data_version,
+        'strings': strings,
+        'station_count': len(station_records),
+        'membership_count': len(membership_records),
+    }).encode('utf-8')
+
+    stations_offset = _aligned(PREAMBLE.size + len(header))
+    memberships_offset = _aligned(stations_offset + station_records.nbytes)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.stations-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as snapshot:
+            snapshot.write(PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, len(header)))
+            snapshot.write(header)
+            snapshot.write(b'\0' * (stations_offset - snapshot.tell()))
+            snapshot.write(station_records.tobytes())
+            snapshot.write(b'\0' * (memberships_offset - snapshot.tell()))
+            snapshot.write(membership_records.tobytes())
+        # mkstemp creates the file readable by its owner only
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_snapshot(path, max_age=None, data_version=None):
+    """
+    Read stations by searchable area from a snapshot file. Returns None if the file
+    is missing, unreadable, written by a different format version, older than
+    max_age seconds, or (when data_version is given) built from different seed
+    data, so the caller can fall back to the database.
+    """
+    try:
+        with open(path, 'rb') as snapshot:
+            magic, version, header_length = PREAMBLE.unpack(snapshot.read(PREAMBLE.size))
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_FORMAT_VERSION:
+                return None
+            header = json.loads(snapshot.read(header_length).decode('utf-8'))
+
+        if max_age is not None and time.time() - header['created_at'] > max_age:
+            return None
+        if data_version is not None and header.get('data_version') != data_version:
+            return None
+
+        strings = header['strings']
+        stations_offset = _aligned(PREAMBLE.size + header_length)
+        station_records = np.memmap(
+            path, dtype=STATION_DTYPE, mode='r',
+            offset=stations_offset, shape=(header['station_count'],),
+        ) if header['station_count'] else np.zeros(0, dtype=STATION_DTYPE)
+        memberships_offset = _aligned(stations_offset + station_records.nbytes)
+        membership_records = np.memmap(
+            path, dtype=MEMBERSHIP_DTYPE, mode='r',
+            offset=memberships_offset, shape=(header['membership_count'],),
+        ) if header['membership_count'] else np.zeros(0, dtype=MEMBERSHIP_DTYPE)
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+
+    stations = []
+    for record in station_records:
+        station = {
+            'Id': int(record['id']),
+            'Latitude': float(record['latitude']),
+            'Longitude': float(record['longitude']),
+        }
+        for field, key in TEXT_FIELDS.items():
+            station[key] = strings[record[field]]
+        stations.append(station)
+
+    stations_by_searchable_area = {}
+    for area, row in zip(membership_records['area'].tolist(), membership_records['station'].tolist()):
+        stations_by_searchable_area.setdefault(strings[area], []).append(stations[row])
+
+    return stations_by_searchable_area
+
+
+def _s3_location(url):
+    """Split an s3://bucket/key URL into its bucket and key."""
+    parsed = urlparse(url)
+    key = parsed.path.lstrip('/')
+    if parsed.scheme != 's3' or not parsed.netloc or not key:
+        raise ValueError(f"Expected an s3://bucket/key URL, got {url}")
+    return parsed.netloc, key
+
+
+def _s3_client():
+    # Imported here so workers, which only read the local file, don't load boto3
+    import boto3
+    return boto3.client('s3')
+
+
+def upload_snapshot(path, url, client=None):
+    """Copy a snapshot file to an s3://bucket/key URL."""
+    bucket, key = _s3_location(url)
+    (client or _s3_client()).upload_file(path, bucket, key)
+
+
+def download_snapshot(url, path, max_age=None, data_version=None, client=None):
+    """
+    Copy a snapshot from an s3://bucket/key URL to path. The file at path is only
+    replaced when the download is a snapshot read_snapshot accepts. Returns the
+    stations by searchable area it holds, or None.
+    """
+    bucket, key = _s3_location(url)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.stations-', suffix='.tmp')
+    os.close(fd)
+    try:
+        (client or _s3_client()).download_file(bucket, key, tmp_path)
+        stations_by_searchable_area = read_snapshot(tmp_path, max_age, data_version)
+        if stations_by_searchable_area is not None:
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        return stations_by_searchable_area
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
@@ -0,0 +1,50 @@
+"""
+Compare how long it takes to load the station catalog from the database versus
+from the snapshot file. Needs a seeded database.
+
+Usage: python scripts/benchmarks/benchmark_catalog_load.py [iterations]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from app.db.database import SessionLocal
+from app.services.location_service import build_stations_by_searchable_area
+from app.services.station_catalog import StationCatalog
+from app.services.station_snapshot import read_snapshot, write_snapshot
+
+
+def time_load(load, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        StationCatalog(load())
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def load_from_db():
+    # A fresh session each time, as a cold worker would have
+    db = SessionLocal()
+    try:
+        return build_stations_by_searchable_area(db)
+    finally:
+        db.close()
+
+def report(name, timings):
+    print(
+        f'{name:<10} median {statistics.median(timings):8.2f} ms  '
+        f'min {min(timings):8.2f} ms  max {max(timings):8.2f} ms'
+    )
+
+
+iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    snapshot_path = os.path.join(tmp_dir, 'stations.snapshot')
+    write_snapshot(snapshot_path, load_from_db())
+    print(f'Snapshot size: {os.path.getsize(snapshot_path)} bytes')
+
+    report('database', time_load(load_from_db, iterations))
+    report('snapshot', time_load(lambda: read_snapshot(snapshot_path), iterations))
@@ -0,0 +1,68 @@
+"""
+Compare vectorized origin x station distance matrices against a pure-Python
+haversine loop. Uses the station snapshot when one exists, otherwise ~150 random
+stations spread over SEPTA's service area.
+
+Usage: python scripts/benchmarks/benchmark_haversine.py [origin counts...]
+"""
+import math
+import sys
+import time
+import numpy as np
+
+from app.services.geo import EARTH_RADIUS_METERS, haversine_matrix, nearest
+from app.services.location_service import STATION_SNAPSHOT_PATH
+from app.services.station_snapshot import read_snapshot
+
+
+def python_haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(min(a, 1.0)))
+
+def python_nearest(origins, stations):
+    return [
+        min(range(len(stations)), key=lambda i: python_haversine(lat, lon, *stations[i]))
+        for lat, lon in origins
+    ]
+
+def numpy_nearest(origin_latitudes, origin_longitudes, latitudes, longitudes):
+    return nearest(haversine_matrix(origin_latitudes, origin_longitudes, latitudes, longitudes), 1)[:, 0]
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+rng = np.random.default_rng(0)
+stations_by_searchable_area = read_snapshot(STATION_SNAPSHOT_PATH)
+if stations_by_searchable_area:
+    unique = {station['Id']: station for stations in stations_by_searchable_area.values() for station in stations}
+    latitudes = np.array([station['Latitude'] for station in unique.values()])
+    longitudes = np.array([station['Longitude'] for station in unique.values()])
+else:
+    latitudes = rng.uniform(39.66, 40.37, 150)
+    longitudes = rng.uniform(-75.79, -74.66, 150)
+stations = list(zip(latitudes.tolist(), longitudes.tolist()))
+
+counts = [int(count) for count in sys.argv[1:]] or [1, 1000, 100000]
+print(f'{len(stations)} stations')
+for count in counts:
+    origin_latitudes = rng.uniform(39.66, 40.37, count)
+    origin_longitudes = rng.uniform(-75.79, -74.66, count)
+    origins = list(zip(origin_latitudes.tolist(), origin_longitudes.tolist()))
+
+    expected, python_seconds = timed(python_nearest, origins, stations)
+    result, numpy_seconds = timed(numpy_nearest, origin_latitudes, origin_longitudes, latitudes, longitudes)
+    assert result.tolist() == expected
+
+    print(
+        f'{count:>7} origins: python {python_seconds * 1000:10.2f} ms '
+        f'({count / python_seconds:12.0f} origins/s)  '
+        f'numpy {numpy_seconds * 1000:9.2f} ms ({count / numpy_seconds:12.0f} origins/s)  '
+        f'speedup {python_seconds / numpy_seconds:6.1f}x'
+    )
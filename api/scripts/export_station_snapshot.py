@@ -0,0 +1,30 @@
+"""
+Export the stations and stations_by_geographic_areas data to the station snapshot
+file, so workers can build their station catalog at startup without the database.
+When STATION_SNAPSHOT_URL is set the snapshot is uploaded there too, so new
+containers can fetch it before the database is reachable.
+
+Usage: python scripts/export_station_snapshot.py [output path]
+"""
+import sys
+
+from app.db.database import request_db
+from app.services.location_service import (
+    STATION_DATA_VERSION, STATION_SNAPSHOT_PATH, STATION_SNAPSHOT_URL, build_stations_by_searchable_area,
+)
+from app.services.station_snapshot import upload_snapshot, write_snapshot
+
+
+db = next(request_db())
+path = sys.argv[1] if len(sys.argv) > 1 else STATION_SNAPSHOT_PATH
+
+print('Reading stations by geographic area...')
+stations_by_searchable_area = build_stations_by_searchable_area(db)
+db.close()
+
+print(f'Writing station snapshot to {path}...')
+write_snapshot(path, stations_by_searchable_area, STATION_DATA_VERSION)
+
+if STATION_SNAPSHOT_URL:
+    print(f'Uploading station snapshot to {STATION_SNAPSHOT_URL}...')
+    upload_snapshot(path, STATION_SNAPSHOT_URL)
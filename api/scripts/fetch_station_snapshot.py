@@ -0,0 +1,32 @@
+"""
+Check for a usable station snapshot before the application starts, downloading
+it from STATION_SNAPSHOT_URL first when that is set. Exits with status 0 when a
+usable snapshot is in place at STATION_SNAPSHOT_PATH and 1 otherwise, so
+start.sh can tell whether the application can start without the database. A
+snapshot built from other seed data than this image's isn't usable, so the seeds
+run and the snapshot is exported again.
+
+Usage: python scripts/fetch_station_snapshot.py
+"""
+import sys
+
+from app.services.location_service import (
+    STATION_DATA_VERSION, STATION_SNAPSHOT_MAX_AGE, STATION_SNAPSHOT_PATH, STATION_SNAPSHOT_URL,
+)
+from app.services.station_snapshot import download_snapshot, read_snapshot
+
+
+if STATION_SNAPSHOT_URL:
+    print(f'Downloading station snapshot from {STATION_SNAPSHOT_URL}...')
+    try:
+        if download_snapshot(
+            STATION_SNAPSHOT_URL, STATION_SNAPSHOT_PATH, STATION_SNAPSHOT_MAX_AGE, STATION_DATA_VERSION
+        ) is None:
+            print('The downloaded station snapshot is stale, from other seed data, or unreadable')
+    except Exception as e:
+        print(f'Downloading the station snapshot failed: {e}')
+
+if read_snapshot(STATION_SNAPSHOT_PATH, STATION_SNAPSHOT_MAX_AGE, STATION_DATA_VERSION) is None:
+    print(f'No usable station snapshot at {STATION_SNAPSHOT_PATH}')
+    sys.exit(1)
+print(f'Station snapshot ready at {STATION_SNAPSHOT_PATH}')
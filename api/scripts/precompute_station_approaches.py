@@ -0,0 +1,104 @@
+"""
+Precompute walking routes from a ring of entry points around each station to the
+station, and store them in the station_approach_routes table. The API appends
+these to a route to the nearest entry point instead of routing the whole walk.
+
+Each route is one Google Directions request, so a full run costs
+(number of stations x number of bearings) requests. They are metered against the
+directions budgets like the API's own calls. When the budget for the minute is
+used up the run waits for the next minute, and when the day's is it stops;
+stations finished by then keep their new routes.
+
+Usage: python scripts/precompute_station_approaches.py [radius in meters] [number of bearings]
+"""
+import json
+import sys
+import time
+
+from app.db.database import request_db
+from app.models.station_approach_route import StationApproachRoute
+from app.services.geo import destination_point
+from app.services.location_service import google_maps_client, load_station_catalog
+from app.services import quota
+from app.services.quota import QuotaExceeded
+
+
+def directions_within_budget(gmaps, *args, **kwargs):
+    """Directions, waiting once for the next minute if this minute's budget is used up."""
+    try:
+        return gmaps.directions(*args, **kwargs)
+    except QuotaExceeded as e:
+        if e.window != 'minute':
+            raise
+    print('Directions budget for this minute used up, waiting for the next one...')
+    time.sleep(60 - time.time() % 60)
+    return gmaps.directions(*args, **kwargs)
+
+
+def approach_route(gmaps, point, station):
+    """
+    The walking route from a point to the station, as its start, walking distance in
+    meters and steps. Google starts the route at the nearest walkable spot to the
+    point, which becomes the entry point.
+    """
+    directions = directions_within_budget(
+        gmaps,
+        point,
+        (station['Latitude'], station['Longitude']),
+        mode='walking',
+        units='imperial',
+    )
+    if not directions:
+        return None
+    leg = directions[0]['legs'][0]
+    steps = [
+        {
+            'instruction': step['html_instructions'],
+            'distance': step['distance']['text'],
+        } for step in leg['steps']
+    ]
+    start = (leg['start_location']['lat'], leg['start_location']['lng'])
+    return start, leg['distance']['value'], steps
+
+
+db = next(request_db())
+radius = float(sys.argv[1]) if len(sys.argv) > 1 else 400.0
+bearing_count = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+# The routes are stored here, so there is no use keeping them in the response cache
+gmaps = google_maps_client(cached=False)
+# Start from today's usage by the API
+quota.quota_tracker.sync()
+station_catalog = load_station_catalog(db)
+
+print(f'Precomputing approaches from {bearing_count} entry points {radius:g} m from each station...')
+try:
+    for station in station_catalog.stations.values():
+        db.query(StationApproachRoute).filter(StationApproachRoute.station_id == station['Id']).delete()
+        for i in range(bearing_count):
+            bearing = round(i * 360 / bearing_count)
+            point = destination_point((station['Latitude'], station['Longitude']), bearing, radius)
+            route = approach_route(gmaps, point, station)
+            if not route:
+                # No walking route from here, ex: the point is in a river
+                continue
+            entry, distance, steps = route
+            db.add(StationApproachRoute(
+                station_id=station['Id'],
+                bearing=bearing,
+                radius=radius,
+                entry_latitude=entry[0],
+                entry_longitude=entry[1],
+                steps=json.dumps(steps),
+                distance=distance,
+                fetched_at=time.time(),
+            ))
+        db.commit()
+        print(f"{station['Name']} done")
+except QuotaExceeded as e:
+    # Keep the station's previous routes rather than a partial set
+    db.rollback()
+    print(f'Stopped: {e}')
+    sys.exit(1)
+finally:
+    db.close()
+    quota.quota_tracker.shutdown()
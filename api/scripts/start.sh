@@ -1,19 +1,35 @@
 #!/bin/sh
 
+echo "Fetching station snapshot"
+if python /app/scripts/fetch_station_snapshot.py; then
+    SNAPSHOT_READY=true
+fi
+
 echo "Running Migrations"
-alembic upgrade head
+if [ "$SNAPSHOT_READY" = true ]; then
+    # The snapshot holds the station data, so the application can start even if
+    # the database is unreachable. Migrations are still attempted, since a deploy
+    # may add tables, but they don't hold up startup.
+    timeout "${MIGRATION_TIMEOUT:-60}" alembic upgrade head || echo "Migrations failed or timed out, starting from the station snapshot"
+    echo "Station snapshot is ready, skipping seeds"
+else
+    alembic upgrade head
+
+    SEEDS_PATH="/app/scripts/seeds"
+    PYTHON_FILES=$(ls $SEEDS_PATH/*.py 2>/dev/null)
+    if [ -z "$PYTHON_FILES" ]; then
+        echo "No Python files found in $SEEDS_PATH"
+        exit 1
+    fi
+    for seed in $PYTHON_FILES; do
+        echo "Running $seed..."
+        python "$seed"
+        echo ''
+    done
 
-SEEDS_PATH="/app/scripts/seeds"
-PYTHON_FILES=$(ls $SEEDS_PATH/*.py 2>/dev/null)
-if [ -z "$PYTHON_FILES" ]; then
-    echo "No Python files found in $SEEDS_PATH"
-    exit 1
+    echo "Exporting station snapshot"
+    python /app/scripts/export_station_snapshot.py || echo "Station snapshot export failed, workers will load stations from the database"
 fi
-for seed in $PYTHON_FILES; do
-    echo "Running $seed..."
-    python "$seed"
-    echo ''
-done
 
 APP_MODULE="app.main:app"
 APP_PORT="8000"
@@ -0,0 +1,17 @@
+import pytest
+from fake_maps_server import FakeMapsServer
+from app.services import response_cache
+
+
+@pytest.fixture
+def maps_server(monkeypatch):
+    '''
+    Point the API at a local fake Google Maps server, with a fresh in-memory
+    response cache so every call reaches it and nothing is written to the database.
+    '''
+    cache = response_cache.ResponseCache(response_cache.MemoryResponseStore())
+    monkeypatch.setattr(response_cache, 'cache', cache)
+    with FakeMapsServer() as server:
+        monkeypatch.setenv('GOOGLE_MAPS_BASE_URL', server.base_url)
+        yield server
+    cache.shutdown()
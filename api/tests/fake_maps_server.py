@@ -0,0 +1,104 @@
+"""A local stand-in for the Google Maps web services, for tests that shouldn't bill anything."""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+API_PATHS = {
+    '/maps/api/geocode/json': 'geocode',
+    '/maps/api/distancematrix/json': 'distance_matrix',
+    '/maps/api/directions/json': 'directions',
+}
+
+
+def geocode_result(lat, lng, state='PA', county='Philadelphia County'):
+    return {
+        'status': 'OK',
+        'results': [{
+            'address_components': [
+                {'long_name': county, 'short_name': county, 'types': ['administrative_area_level_2', 'political']},
+                {'long_name': state, 'short_name': state, 'types': ['administrative_area_level_1', 'political']},
+            ],
+            'geometry': {'location': {'lat': lat, 'lng': lng}},
+        }],
+    }
+
+
+def distance_matrix_result(params):
+    """Every destination is reachable, and further down the list is further away."""
+    destinations = params['destinations'].split('|')
+    return {
+        'status': 'OK',
+        'rows': [{
+            'elements': [
+                {'status': 'OK', 'distance': {'text': f'{i + 1} mi', 'value': 1000 * (i + 1)}}
+                for i in range(len(destinations))
+            ],
+        }],
+    }
+
+
+def directions_result(steps=('Head <b>north</b>', 'Turn <b>left</b>'), step_distance=160, start=(39.9526, -75.1652)):
+    return {
+        'status': 'OK',
+        'routes': [{
+            'legs': [{
+                'start_location': {'lat': start[0], 'lng': start[1]},
+                'distance': {'text': f'{step_distance * len(steps)} m', 'value': step_distance * len(steps)},
+                'steps': [
+                    {'html_instructions': step, 'distance': {'text': f'{step_distance} m', 'value': step_distance}}
+                    for step in steps
+                ],
+            }],
+        }],
+    }
+
+
+class FakeMapsServer():
+    """
+    Serves canned Google Maps responses on localhost. Responses can be set per call
+    type as a dict or a function of the query parameters, and every request is
+    recorded as a (call type, params) pair.
+    """
+    def __init__(self):
+        self.requests = []
+        self.responses = {
+            'geocode': geocode_result(39.9526, -75.1652),
+            'distance_matrix': distance_matrix_result,
+            'directions': directions_result(),
+        }
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                call_type = API_PATHS.get(url.path)
+                if call_type is None:
+                    self.send_error(404)
+                    return
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                server.requests.append((call_type, params))
+                response = server.responses[call_type]
+                body = json.dumps(response(params) if callable(response) else response).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def calls(self, call_type):
+        return [params for recorded_type, params in self.requests if recorded_type == call_type]
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,24 @@
+"""Helpers shared by the tests."""
+
+
+def make_station(station_id, name, latitude, longitude, line='Paoli Thorndale Line', zip_code='19103', address='1 Test St'):
+    '''A station dictionary like the ones the station catalog is built from.'''
+    return {
+        'Id': station_id,
+        'Line': line,
+        'Name': name,
+        'Latitude': latitude,
+        'Longitude': longitude,
+        'Address': address,
+        'City': 'Philadelphia',
+        'State': 'PA',
+        'Zip': zip_code,
+    }
+
+class FakeClock():
+    '''A clock for code that takes one, which only moves when a test sets now.'''
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
@@ -1,6 +1,10 @@
 from fastapi.testclient import TestClient
+import orjson
 import pytest
+from helpers import make_station
 from app.main import app
+from app.services import location_service
+from app.services.station_catalog import StationCatalog
 
 @pytest.fixture(scope='session')
 def test_client():
@@ -140,4 +144,43 @@ def test_address_no_viable_route(address, test_client: TestClient):
     })
     
     assert response.status_code == 400
-    assert response.json()["detail"] == f"Sorry, no viable route for walking can be found for {address}. Please try again."
\ No newline at end of file
+    assert response.json()["detail"] == f"Sorry, no viable route for walking can be found for {address}. Please try again."
+
+@pytest.fixture
+def station_catalog(monkeypatch):
+    '''Serve a small station catalog without touching the database.'''
+    catalog = StationCatalog({'Philadelphia': [make_station(1, 'Suburban Station', 39.9539, -75.1677, line='Joint', address='16th St & JFK Blvd')]})
+    monkeypatch.setattr(location_service, '_station_catalog', catalog)
+    return catalog
+
+def test_all_stations(station_catalog, test_client: TestClient):
+    response = test_client.get("/api/stations")
+
+    assert response.status_code == 200
+    assert response.headers["etag"] == station_catalog.etag
+    assert "max-age" in response.headers["cache-control"]
+    assert response.json() == {
+        "type": "FeatureCollection",
+        "features": [{
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [-75.1677, 39.9539]},
+            "properties": {
+                "name": "Suburban Station",
+                "address": "16th St & JFK Blvd",
+                "city": "Philadelphia",
+                "state": "PA",
+                "zip": "19103",
+            },
+        }],
+    }
+    assert orjson.loads(bytes(station_catalog.geojson[1])) == response.json()["features"][0]
+
+@pytest.mark.parametrize('if_none_match', ['{etag}', 'W/{etag}', '"other", {etag}', '*'])
+def test_all_stations_not_modified(if_none_match, station_catalog, test_client: TestClient):
+    response = test_client.get("/api/stations", headers={
+        "If-None-Match": if_none_match.format(etag=station_catalog.etag),
+    })
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == station_catalog.etag
+    assert response.content == b""
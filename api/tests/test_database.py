@@ -0,0 +1,114 @@
+from fastapi.testclient import TestClient
+import threading
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from helpers import make_station
+from app.db import database
+from app.db.database import BASE, engine_options
+from app.main import app
+from app.services import location_service, quota, response_cache, route_fragments
+from app.services.quota import QuotaTracker
+from app.services.response_cache import ResponseCache
+from app.services.station_snapshot import write_snapshot
+
+
+STATIONS_BY_SEARCHABLE_AREA = {
+    'Philadelphia': [make_station(1, 'Suburban Station', 39.9539, -75.1677, line='Joint', address='16th St & JFK Blvd')],
+}
+# Threads of the response cache's and the quota tracker's executors
+BACKGROUND_THREAD_PREFIXES = ('response-cache', 'quota-sync')
+
+@pytest.fixture
+def file_database(monkeypatch, tmp_path):
+    '''A file-backed SQLite database with the tables created, used by every session.'''
+    file_engine = create_engine(f"sqlite:///{tmp_path / 'septa_walking_app.db'}")
+    BASE.metadata.create_all(file_engine)
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=file_engine)
+    for module in (database, location_service, quota, response_cache, route_fragments):
+        monkeypatch.setattr(module, 'SessionLocal', session_local)
+    yield file_engine
+    file_engine.dispose()
+
+@pytest.fixture
+def checkouts(monkeypatch, file_database):
+    '''
+    Record connections checked out of the pool, and sessions opened, with the thread
+    that did it. Sessions only check out a connection when first used, so both are
+    recorded.
+    '''
+    recorded = []
+    def on_checkout(*args):
+        recorded.append(('checkout', threading.current_thread().name))
+    session_local = database.SessionLocal
+    def recording_session_local():
+        recorded.append(('session', threading.current_thread().name))
+        return session_local()
+    monkeypatch.setattr(database, 'SessionLocal', recording_session_local)
+    event.listen(file_database, 'checkout', on_checkout)
+    yield recorded
+    event.remove(file_database, 'checkout', on_checkout)
+
+@pytest.fixture
+def database_stores(monkeypatch, maps_server, file_database):
+    '''The response cache and quota tracker as the application builds them, backed by the database.'''
+    cache = ResponseCache.from_env()
+    tracker = QuotaTracker.from_env()
+    monkeypatch.setattr(response_cache, 'cache', cache)
+    monkeypatch.setattr(quota, 'quota_tracker', tracker)
+    yield cache, tracker
+    cache.shutdown()
+    tracker.shutdown()
+
+@pytest.fixture
+def snapshot_catalog(monkeypatch, tmp_path):
+    '''Start with no cached catalog, and a station snapshot on disk.'''
+    snapshot_path = str(tmp_path / 'stations.snapshot')
+    write_snapshot(snapshot_path, STATIONS_BY_SEARCHABLE_AREA, location_service.STATION_DATA_VERSION)
+    monkeypatch.setattr(location_service, 'STATION_SNAPSHOT_PATH', snapshot_path)
+    monkeypatch.setattr(location_service, '_station_catalog', None)
+    monkeypatch.setattr(quota, 'quota_tracker', QuotaTracker())
+
+def test_engine_options(monkeypatch):
+    monkeypatch.setenv('DB_POOL_SIZE', '20')
+    monkeypatch.setenv('DB_MAX_OVERFLOW', '0')
+    monkeypatch.setenv('DB_POOL_PRE_PING', 'false')
+    monkeypatch.setenv('DB_POOL_RECYCLE', '300')
+
+    options = engine_options('postgresql://postgres:postgres@db/septa_walking_app')
+    assert options['pool_size'] == 20
+    assert options['max_overflow'] == 0
+    assert options['pool_pre_ping'] is False
+    assert options['pool_recycle'] == 300
+    assert engine_options('sqlite://') == {}
+
+def test_warm_requests_use_no_connections(snapshot_catalog, database_stores, checkouts):
+    test_client = TestClient(app)
+    location_service.load_station_catalog()
+
+    response = test_client.post("/api", json={
+        "location_type": "coordinates",
+        "latitude": 39.9530,
+        "longitude": -75.1650,
+    })
+    assert response.status_code == 200
+    assert response.json()["station"]["properties"]["name"] == "Suburban Station"
+    assert test_client.get("/api/stations").status_code == 200
+
+    # Saving the responses and syncing usage check out connections, but only on
+    # the background threads, never while serving the request
+    cache, tracker = database_stores
+    cache.shutdown()
+    tracker.shutdown()
+    assert checkouts
+    assert [
+        thread for _, thread in checkouts if not thread.startswith(BACKGROUND_THREAD_PREFIXES)
+    ] == []
+
+def test_cold_start_from_snapshot_uses_no_connections(snapshot_catalog, checkouts):
+    response = TestClient(app).get("/api/stations")
+
+    assert response.status_code == 200
+    assert location_service.station_catalog_loaded()
+    # A cold request is given a session, but the snapshot means it's never used
+    assert 'checkout' not in checkouts
@@ -0,0 +1,28 @@
+import math
+import numpy as np
+import pytest
+from app.services.geo import EARTH_RADIUS_METERS, haversine, haversine_matrix, nearest
+
+
+def test_one_degree_of_longitude_at_equator():
+    distance = haversine((0.0, 0.0), [0.0], [1.0])[0]
+    assert distance == pytest.approx(EARTH_RADIUS_METERS * math.pi / 180)
+
+def test_matrix_shape_and_symmetry():
+    latitudes = [39.9539, 39.9566, 40.0024]
+    longitudes = [-75.1677, -75.1819, -75.2722]
+    matrix = haversine_matrix(latitudes, longitudes, latitudes, longitudes)
+
+    assert matrix.shape == (3, 3)
+    assert np.allclose(np.diag(matrix), 0.0)
+    assert np.allclose(matrix, matrix.T)
+
+@pytest.mark.parametrize('limit', [None, 2, 10])
+def test_nearest(limit):
+    distances = np.array([
+        [30.0, 10.0, 20.0],
+        [5.0, 50.0, 1.0],
+    ])
+    expected = np.array([[1, 2, 0], [2, 0, 1]])[:, :limit]
+
+    assert nearest(distances, limit).tolist() == expected.tolist()
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import threading
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import pytest
+from app.routers.admin_router import AdminRouter
+from app.services import profiler
+from app.services.loop_monitor import EventLoopLagMonitor
+from app.services.profiler import SamplingProfiler
+
+
+def busy_wait_for_profiler(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_wait_for_profiler, args=(stop,), name='busy-thread')
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+@pytest.fixture
+def admin_client(monkeypatch):
+    monkeypatch.setenv('ADMIN_TOKEN', 'secret-token')
+    admin_app = FastAPI()
+    admin_app.include_router(AdminRouter, prefix="/admin")
+    return TestClient(admin_app)
+
+@pytest.mark.parametrize('mode', ['wall', 'cpu'])
+def test_samples_other_threads(mode, busy_thread):
+    folded = SamplingProfiler(interval=0.001, mode=mode).run(0.2)
+
+    lines = folded.splitlines()
+    busy = [line for line in lines if line.startswith('busy-thread;') and 'busy_wait_for_profiler' in line]
+    assert busy
+    stack, count = busy[0].rsplit(' ', 1)
+    assert int(count) > 0
+    assert 'test_profiler.py' in stack
+
+def test_exited_thread_not_running(busy_thread, monkeypatch):
+    # The busy thread's stat file is gone, as if it exited after being listed
+    def open_stat(path, *args, **kwargs):
+        if path == f'/proc/self/task/{busy_thread.native_id}/stat':
+            raise FileNotFoundError(path)
+        return open(path, *args, **kwargs)
+    monkeypatch.setattr(profiler, 'open', open_stat, raising=False)
+
+    running = profiler._running_thread_idents()
+    assert running is not None
+    assert busy_thread.ident not in running
+
+    cpu_profiler = SamplingProfiler(mode='cpu')
+    cpu_profiler.sample()
+    assert not any(stack.startswith('busy-thread;') for stack in cpu_profiler.samples)
+
+def test_invalid_mode():
+    with pytest.raises(ValueError):
+        SamplingProfiler(mode='memory')
+
+def test_loop_monitor_logs_blocking_stack(caplog):
+    def block_the_loop():
+        time.sleep(0.3)
+
+    async def main():
+        monitor = EventLoopLagMonitor(threshold=0.05)
+        await monitor.start()
+        await asyncio.sleep(0.05)
+        block_the_loop()
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    with caplog.at_level(logging.WARNING, logger='app.services.loop_monitor'):
+        asyncio.run(main())
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert any('block_the_loop' in message for message in messages)
+    assert any(message.startswith('Event loop was blocked for') for message in messages)
+
+@pytest.mark.parametrize('headers', [
+    {},
+    {"Authorization": "Bearer wrong-token"},
+    {"Authorization": "Basic secret-token"},
+])
+def test_profile_requires_token(headers, admin_client: TestClient):
+    response = admin_client.get("/admin/profile", params={"seconds": 0.01}, headers=headers)
+
+    assert response.status_code == 401
+
+def test_profile(admin_client: TestClient):
+    response = admin_client.get(
+        "/admin/profile",
+        params={"seconds": 0.1},
+        headers={"Authorization": "Bearer secret-token"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-disposition"].startswith('attachment; filename="profile-wall-')
+    assert response.text.strip()
+
+def test_profile_too_long(admin_client: TestClient):
+    response = admin_client.get(
+        "/admin/profile",
+        params={"seconds": 3600},
+        headers={"Authorization": "Bearer secret-token"},
+    )
+
+    assert response.status_code == 400
@@ -0,0 +1,223 @@
+from fastapi.testclient import TestClient
+import googlemaps
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from fake_maps_server import geocode_result
+from helpers import FakeClock, make_station
+from app.main import app
+from app.models.google_usage import GoogleUsage
+from app.services import location_service, quota
+from app.services.quota import DatabaseUsageStore, MemoryUsageStore, MeteredClient, QuotaExceeded, QuotaTracker
+from app.services.station_catalog import StationCatalog
+
+
+@pytest.fixture
+def station_catalog(monkeypatch):
+    catalog = StationCatalog({
+        'Philadelphia': [
+            make_station(1, 'Suburban Station', 39.9539, -75.1677, line='Joint'),
+            make_station(2, 'Temple University', 39.9815, -75.1495, line='Joint'),
+            make_station(3, 'Overbrook', 39.9898, -75.2495),
+        ],
+    })
+    monkeypatch.setattr(location_service, '_station_catalog', catalog)
+    return catalog
+
+def use_tracker(monkeypatch, budgets):
+    tracker = QuotaTracker(budgets)
+    monkeypatch.setattr(quota, 'quota_tracker', tracker)
+    return tracker
+
+def test_charge_and_window_rollover():
+    clock = FakeClock()
+    tracker = QuotaTracker({'distance_matrix': {'minute': 10, 'day': 15}}, clock=clock)
+
+    tracker.charge('distance_matrix', 10)
+    with pytest.raises(QuotaExceeded) as exc_info:
+        tracker.charge('distance_matrix', 1)
+    assert exc_info.value.window == 'minute'
+
+    clock.now = 60
+    tracker.charge('distance_matrix', 5)
+    with pytest.raises(QuotaExceeded) as exc_info:
+        tracker.charge('distance_matrix', 1)
+    assert exc_info.value.window == 'day'
+
+    clock.now = 86400
+    tracker.charge('distance_matrix', 1)
+    assert tracker.usage()['distance_matrix']['day'] == {'used': 1, 'budget': 15}
+
+def test_unlimited_by_default():
+    tracker = QuotaTracker()
+    tracker.charge('geocode', 10 ** 9)
+    assert tracker.utilization('geocode') == 0.0
+
+def test_day_usage_survives_restart():
+    clock = FakeClock(86400 * 100 + 10)
+    store = MemoryUsageStore()
+    budgets = {'directions': {'day': 10}}
+    tracker = QuotaTracker(budgets, clock=clock, store=store)
+    tracker.charge('directions', 8)
+    tracker.shutdown()
+
+    restarted = QuotaTracker(budgets, clock=clock, store=store)
+    restarted.sync()
+    assert restarted.usage()['directions']['day']['used'] == 8
+    assert restarted.usage()['directions']['minute']['used'] == 0
+    with pytest.raises(QuotaExceeded) as exc_info:
+        restarted.charge('directions', 3)
+    assert exc_info.value.window == 'day'
+
+    # The next day starts from zero
+    clock.now += 86400
+    restarted.charge('directions', 10)
+
+def test_day_usage_shared_between_processes():
+    clock = FakeClock(86400 * 100)
+    store = MemoryUsageStore()
+    first = QuotaTracker(clock=clock, store=store, sync_every=3600)
+    second = QuotaTracker(clock=clock, store=store, sync_every=3600)
+
+    first.charge('geocode', 5)
+    second.charge('geocode', 2)
+    first.sync()
+    second.sync()
+    first.sync()
+    # Syncing again doesn't add the same units twice
+    second.sync()
+
+    assert first.usage()['geocode']['day']['used'] == 7
+    assert second.usage()['geocode']['day']['used'] == 7
+    second.charge('geocode', 1)
+    assert second.usage()['geocode']['day']['used'] == 8
+    assert store.usage == {('geocode', 100): 7}
+    first.shutdown()
+    second.shutdown()
+    assert store.usage == {('geocode', 100): 8}
+
+def test_charges_sync_in_background():
+    clock = FakeClock(86400 * 100)
+    store = MemoryUsageStore()
+    tracker = QuotaTracker(clock=clock, store=store, sync_every=10)
+
+    tracker.charge('directions')
+    tracker.executor.shutdown(wait=True)
+    assert store.usage == {('directions', 100): 1}
+
+def test_database_usage_store(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'usage.db'}")
+    GoogleUsage.__table__.create(engine)
+    monkeypatch.setattr(quota, 'SessionLocal', sessionmaker(bind=engine))
+    store = DatabaseUsageStore()
+
+    assert store.add_and_load(90, {'geocode': 4}) == {'geocode': 4}
+    assert store.add_and_load(100, {'geocode': 1, 'directions': 2}) == {'geocode': 1, 'directions': 2}
+    assert store.add_and_load(100, {'geocode': 3}) == {'geocode': 4, 'directions': 2}
+    # Day 90 is past the retention period
+    assert store.add_and_load(90, {}) == {}
+
+@pytest.mark.parametrize('matrix_used, directions_used, level, candidate_limit, directions', [
+    (0, 0, 'full', 25, True),
+    (80, 0, 'reduced', 5, True),
+    (100, 0, 'minimal', 0, True),
+    (0, 10, 'minimal', 25, False),
+])
+def test_plan(matrix_used, directions_used, level, candidate_limit, directions):
+    tracker = QuotaTracker({
+        'distance_matrix': {'day': 100},
+        'directions': {'day': 10},
+    })
+    tracker.charge('distance_matrix', matrix_used)
+    tracker.charge('directions', directions_used)
+
+    plan = tracker.plan(25, 5)
+    assert plan.level == level
+    assert plan.candidate_limit == candidate_limit
+    assert plan.include_directions == directions
+    assert plan.validate_with_distance_matrix == (matrix_used < 80)
+    assert (plan.as_response() is None) == (level == 'full')
+
+def test_metered_client_counts_elements(maps_server):
+    tracker = QuotaTracker({'distance_matrix': {'minute': 4}})
+    client = MeteredClient(googlemaps.Client(key='AIzaFakeKey', base_url=maps_server.base_url), tracker)
+
+    client.distance_matrix((39.95, -75.16), [(39.96, -75.17), (39.97, -75.18), (39.98, -75.19)])
+    client.geocode('1600 Market St')
+    assert tracker.usage()['distance_matrix']['minute']['used'] == 3
+    assert tracker.usage()['geocode']['minute']['used'] == 1
+
+    with pytest.raises(QuotaExceeded):
+        client.distance_matrix((39.95, -75.16), [(39.96, -75.17), (39.97, -75.18)])
+    assert len(maps_server.calls('distance_matrix')) == 1
+
+def test_full_service(maps_server, station_catalog, monkeypatch):
+    use_tracker(monkeypatch, {})
+    response = TestClient(app).post("/api", json={
+        "location_type": "coordinates",
+        "latitude": 39.9530,
+        "longitude": -75.1650,
+    })
+
+    assert response.status_code == 200
+    assert "degraded" not in response.json()
+    assert len(response.json()["directions"]) == 2
+    assert len(maps_server.calls('distance_matrix')) == 2
+    assert len(maps_server.calls('directions')) == 1
+
+def test_reduced_service(maps_server, station_catalog, monkeypatch):
+    tracker = use_tracker(monkeypatch, {'distance_matrix': {'day': 10}})
+    tracker.charge('distance_matrix', 8)
+    monkeypatch.setattr(location_service, 'DEGRADED_CANDIDATE_LIMIT', 2)
+
+    response = TestClient(app).post("/api", json={
+        "location_type": "coordinates",
+        "latitude": 39.9530,
+        "longitude": -75.1650,
+    })
+
+    assert response.status_code == 200
+    assert response.json()["degraded"]["level"] == "reduced"
+    assert response.json()["station"]["properties"]["name"] == "Suburban Station"
+    # No validation call, and only the two nearest stations in the one that was made
+    calls = maps_server.calls('distance_matrix')
+    assert len(calls) == 1
+    assert len(calls[0]['destinations'].split('|')) == 2
+
+def test_minimal_service(maps_server, station_catalog, monkeypatch):
+    use_tracker(monkeypatch, {'distance_matrix': {'day': 0}, 'directions': {'day': 0}})
+
+    response = TestClient(app).post("/api", json={
+        "location_type": "coordinates",
+        "latitude": 39.9810,
+        "longitude": -75.1500,
+    })
+
+    assert response.status_code == 200
+    assert response.json()["degraded"]["level"] == "minimal"
+    assert response.json()["station"]["properties"]["name"] == "Temple University"
+    assert response.json()["directions"] == []
+    assert maps_server.requests == []
+
+def test_minimal_service_too_far(maps_server, station_catalog, monkeypatch):
+    use_tracker(monkeypatch, {'distance_matrix': {'day': 0}})
+    maps_server.responses['geocode'] = geocode_result(40.4406, -79.9959)
+
+    response = TestClient(app).post("/api", json={
+        "location_type": "address",
+        "address": "Pittsburgh, PA",
+    })
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Sorry, Pittsburgh, PA is too far from any stations to walk. Please try again."
+
+def test_geocode_budget_exhausted(maps_server, station_catalog, monkeypatch):
+    use_tracker(monkeypatch, {'geocode': {'minute': 0}})
+
+    response = TestClient(app).post("/api", json={
+        "location_type": "address",
+        "address": "1600 Market St, Philadelphia, PA",
+    })
+
+    assert response.status_code == 503
+    assert maps_server.calls('geocode') == []
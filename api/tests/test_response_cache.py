@@ -0,0 +1,184 @@
+import googlemaps
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from helpers import FakeClock
+from app.models.google_response import GoogleResponse
+from app.services import response_cache
+from app.services.quota import QuotaExceeded
+from app.services.response_cache import (
+    CacheEntry, CachedClient, DatabaseResponseStore, MemoryResponseStore, ResponseCache, cache_key,
+)
+
+
+class QueuedExecutor():
+    '''Holds background work until the test runs it.'''
+    def __init__(self):
+        self.queue = []
+
+    def submit(self, function, *args):
+        self.queue.append((function, args))
+
+    def run_all(self):
+        while self.queue:
+            function, args = self.queue.pop(0)
+            function(*args)
+
+    def shutdown(self, wait=True):
+        self.run_all()
+
+class FakeMaps():
+    def __init__(self):
+        self.calls = 0
+
+    def geocode(self, address, **kwargs):
+        self.calls += 1
+        return [{'address': address, 'version': self.calls}]
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def executor():
+    return QueuedExecutor()
+
+@pytest.fixture
+def store():
+    return MemoryResponseStore()
+
+@pytest.fixture
+def cache(store, clock, executor):
+    return ResponseCache(store, fresh_ttl=100, stale_ttl=1000, clock=clock, executor=executor, flush_every=2)
+
+def test_fresh_hit(cache, executor):
+    maps = FakeMaps()
+    client = CachedClient(maps, cache)
+
+    assert client.geocode('1600 Market St') == [{'address': '1600 Market St', 'version': 1}]
+    assert client.geocode('1600 Market St') == [{'address': '1600 Market St', 'version': 1}]
+    assert client.geocode('1 Test St')[0]['version'] == 2
+    assert maps.calls == 2
+
+def test_stale_served_while_revalidating(cache, clock, executor):
+    maps = FakeMaps()
+    client = CachedClient(maps, cache)
+    client.geocode('1600 Market St')
+    executor.run_all()
+
+    clock.now = 150
+    # Stale: the old response comes back and a refresh is queued, only once
+    assert client.geocode('1600 Market St')[0]['version'] == 1
+    assert client.geocode('1600 Market St')[0]['version'] == 1
+    assert maps.calls == 1
+
+    executor.run_all()
+    assert maps.calls == 2
+    assert client.geocode('1600 Market St')[0]['version'] == 2
+
+def test_expired_fetched_before_responding(cache, clock):
+    maps = FakeMaps()
+    client = CachedClient(maps, cache)
+    client.geocode('1600 Market St')
+
+    clock.now = 1000
+    assert client.geocode('1600 Market St')[0]['version'] == 2
+
+def test_persisted_and_warmed_up(cache, store, clock, executor):
+    maps = FakeMaps()
+    client = CachedClient(maps, cache)
+    client.geocode('popular')
+    client.geocode('rare')
+    client.geocode('popular')
+    client.geocode('popular')
+    executor.run_all()
+
+    key = cache_key('geocode', ('popular',), {})
+    assert store.entries[key].hit_count == 2
+
+    # A new process starts with the most requested entries only
+    restarted = ResponseCache(store, fresh_ttl=100, stale_ttl=1000, clock=clock, executor=QueuedExecutor())
+    assert restarted.warm_up(limit=1) == 1
+    assert CachedClient(maps, restarted).geocode('popular')[0]['version'] == 1
+    assert maps.calls == 2
+
+@pytest.mark.parametrize('error', [QuotaExceeded('geocode', 'day'), googlemaps.exceptions.Timeout()])
+def test_expired_served_when_fetch_fails(error, cache, clock):
+    client = CachedClient(FakeMaps(), cache)
+    client.geocode('1600 Market St')
+
+    class FailingMaps():
+        def geocode(self, address, **kwargs):
+            raise error
+
+    clock.now = 1000
+    failing = CachedClient(FailingMaps(), cache)
+    assert failing.geocode('1600 Market St')[0]['version'] == 1
+    with pytest.raises(type(error)):
+        failing.geocode('1 Test St')
+
+def test_database_store_save(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'responses.db'}")
+    GoogleResponse.__table__.create(engine)
+    monkeypatch.setattr(response_cache, 'SessionLocal', sessionmaker(bind=engine))
+    store = DatabaseResponseStore()
+    key = cache_key('geocode', ('1600 Market St',), {})
+
+    store.save(CacheEntry(key, 'geocode', [{'version': 1}], 10))
+    store.add_hits({key: 3}, 20)
+    # Another process saving the same entry replaces the response, not the hits
+    store.save(CacheEntry(key, 'geocode', [{'version': 2}], 30))
+
+    [entry] = store.load_popular(10, 0)
+    assert (entry.response, entry.fetched_at, entry.hit_count) == ([{'version': 2}], 30, 3)
+
+def test_expired_pruned_and_not_warmed_up(cache, store, clock, executor):
+    client = CachedClient(FakeMaps(), cache)
+    client.geocode('old')
+    client.geocode('old')
+    clock.now = 600
+    client.geocode('new')
+    executor.run_all()
+
+    clock.now = 1200
+    restarted = ResponseCache(store, fresh_ttl=100, stale_ttl=1000, clock=clock, executor=QueuedExecutor())
+    assert restarted.warm_up() == 1
+    assert list(restarted.entries) == [cache_key('geocode', ('new',), {})]
+    assert list(store.entries) == [cache_key('geocode', ('new',), {})]
+
+def test_pruned_when_hits_flushed(store, clock, executor):
+    cache = ResponseCache(store, fresh_ttl=100, stale_ttl=1000, flush_every=1, prune_every=150, clock=clock, executor=executor)
+    client = CachedClient(FakeMaps(), cache)
+    client.geocode('old')
+    executor.run_all()
+    clock.now = 900
+    client.geocode('new')
+    client.geocode('new')
+    executor.run_all()
+    assert len(store.entries) == 2
+
+    # The stale TTL has passed for 'old', and so has prune_every since the last prune
+    clock.now = 1100
+    client.geocode('new')
+    executor.run_all()
+    assert list(store.entries) == [cache_key('geocode', ('new',), {})]
+
+def test_errors_not_cached(cache):
+    class FailingMaps():
+        def geocode(self, address, **kwargs):
+            raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        CachedClient(FailingMaps(), cache).geocode('1600 Market St')
+    assert cache.entries == {}
+
+def test_evicts_least_recently_used(store, clock, executor):
+    cache = ResponseCache(store, max_entries=2, clock=clock, executor=executor)
+    client = CachedClient(FakeMaps(), cache)
+    client.geocode('a')
+    client.geocode('b')
+    client.geocode('a')
+    client.geocode('c')
+
+    assert cache_key('geocode', ('b',), {}) not in cache.entries
+    assert cache_key('geocode', ('a',), {}) in cache.entries
@@ -0,0 +1,25 @@
+import orjson
+from app.responses import FastJSONResponse, PrerenderedJSON, render_json
+
+
+def test_render_plain_content():
+    assert orjson.loads(render_json({"a": [1, 2.5, "b"], "c": None})) == {"a": [1, 2.5, "b"], "c": None}
+
+def test_render_prerendered_fragments():
+    content = {
+        "station": PrerenderedJSON(b'{"type":"Feature"}'),
+        "nested": {"fragment": PrerenderedJSON(b'[1,2]'), "value": "x"},
+        "directions": [{"instruction": "Head <b>north</b>"}],
+    }
+
+    assert orjson.loads(render_json(content)) == {
+        "station": {"type": "Feature"},
+        "nested": {"fragment": [1, 2], "value": "x"},
+        "directions": [{"instruction": "Head <b>north</b>"}],
+    }
+
+def test_response_media_type():
+    response = FastJSONResponse(PrerenderedJSON(b'{"ok":true}'))
+
+    assert response.media_type == "application/json"
+    assert response.body == b'{"ok":true}'
@@ -0,0 +1,111 @@
+import pytest
+from fake_maps_server import directions_result
+from helpers import make_station
+from app.services import location_service, quota, route_fragments
+from app.services.geo import destination_point, haversine
+from app.services.location_service import LocationService
+from app.services.quota import QuotaTracker
+from app.services.route_fragments import RouteFragment
+from app.services.station_catalog import StationCatalog
+
+
+STATION = make_station(1, 'Suburban Station', 39.9539, -75.1677, line='Joint', address='16th St & JFK Blvd')
+STATION_COORDINATES = (STATION['Latitude'], STATION['Longitude'])
+APPROACH_STEPS = [{'instruction': 'Turn <b>right</b> onto <b>JFK Blvd</b>', 'distance': '0.2 mi'}]
+
+def fragment(bearing, radius=400, distance=480):
+    return RouteFragment(1, destination_point(STATION_COORDINATES, bearing, radius), radius, APPROACH_STEPS, distance)
+
+@pytest.fixture
+def fragments(monkeypatch):
+    monkeypatch.setattr(route_fragments, '_route_fragments', {1: [fragment(0), fragment(180)]})
+
+@pytest.fixture
+def service(maps_server, monkeypatch):
+    monkeypatch.setattr(location_service, '_station_catalog', StationCatalog({'Philadelphia': [STATION]}))
+    monkeypatch.setattr(quota, 'quota_tracker', QuotaTracker())
+    return LocationService()
+
+def test_destination_point():
+    entry = destination_point(STATION_COORDINATES, 90, 400)
+
+    assert haversine(STATION_COORDINATES, [entry[0]], [entry[1]])[0] == pytest.approx(400, rel=1e-6)
+    assert entry[0] == pytest.approx(STATION['Latitude'], abs=1e-4)
+    assert entry[1] > STATION['Longitude']
+
+def test_best_fragment(fragments):
+    north = destination_point(STATION_COORDINATES, 5, 1500)
+    assert route_fragments.best_fragment(north, STATION).entry == fragment(0).entry
+
+    south = destination_point(STATION_COORDINATES, 175, 1500)
+    assert route_fragments.best_fragment(south, STATION).entry == fragment(180).entry
+
+    # Neither entry point is on the way from the east, or from inside the ring
+    east = destination_point(STATION_COORDINATES, 90, 1500)
+    assert route_fragments.best_fragment(east, STATION) is None
+    inside = destination_point(STATION_COORDINATES, 0, 300)
+    assert route_fragments.best_fragment(inside, STATION) is None
+    assert route_fragments.best_fragment(None, STATION) is None
+
+def test_best_fragment_within_walk_distance(fragments):
+    north = destination_point(STATION_COORDINATES, 5, 1500)
+    # 1100 m to the entry point, estimated at 1375 m walking, and a 480 m approach
+    assert route_fragments.best_fragment(north, STATION, walk_distance=1700) is not None
+    assert route_fragments.best_fragment(north, STATION, walk_distance=1500) is None
+
+def test_stitched_directions(fragments, service, maps_server):
+    maps_server.responses['directions'] = directions_result((
+        'Head <b>south</b> on <b>N 16th St</b>',
+        'Continue onto <b>S 16th St</b><div style="font-size:0.9em">Destination will be on the left</div>',
+    ))
+    origin = destination_point(STATION_COORDINATES, 0, 1500)
+
+    directions = service.walking_directions(origin, STATION, origin)
+
+    assert [step['instruction'] for step in directions] == [
+        'Head <b>south</b> on <b>N 16th St</b>',
+        'Continue onto <b>S 16th St</b>',
+        'Turn <b>right</b> onto <b>JFK Blvd</b>',
+    ]
+    calls = maps_server.calls('directions')
+    assert len(calls) == 1
+    entry = fragment(0).entry
+    latitude, longitude = map(float, calls[0]['destination'].split(','))
+    assert (latitude, longitude) == pytest.approx(entry)
+
+def test_snapped_to_entry_point(fragments, service, maps_server):
+    origin = destination_point(STATION_COORDINATES, 0, 410)
+
+    directions = service.walking_directions(origin, STATION, origin)
+
+    assert directions == APPROACH_STEPS
+    assert maps_server.requests == []
+
+def test_full_route_when_not_applicable(fragments, service, maps_server):
+    origin = destination_point(STATION_COORDINATES, 90, 1500)
+
+    directions = service.walking_directions(origin, STATION, origin)
+
+    assert len(directions) == 2
+    calls = maps_server.calls('directions')
+    assert len(calls) == 1
+    latitude, longitude = map(float, calls[0]['destination'].split(','))
+    assert (latitude, longitude) == pytest.approx(STATION_COORDINATES)
+
+def test_full_route_when_stitched_walk_too_long(fragments, service, maps_server):
+    origin = destination_point(STATION_COORDINATES, 0, 1500)
+    service.walk_distances[STATION['Id']] = 1500
+
+    directions = service.walking_directions(origin, STATION, origin)
+
+    assert len(directions) == 2
+    calls = maps_server.calls('directions')
+    assert len(calls) == 1
+    latitude, longitude = map(float, calls[0]['destination'].split(','))
+    assert (latitude, longitude) == pytest.approx(STATION_COORDINATES)
+
+def test_walk_distance_recorded(service, maps_server):
+    origin = destination_point(STATION_COORDINATES, 0, 1500)
+
+    assert service.shortest_walk_in_area(origin, 'Philadelphia', origin_coordinates=origin) == STATION
+    assert service.walk_distances == {STATION['Id']: 1000}
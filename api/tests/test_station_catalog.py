@@ -0,0 +1,89 @@
+import pytest
+from helpers import make_station
+from app.services.station_catalog import StationCatalog
+
+
+@pytest.fixture
+def catalog():
+    suburban = make_station(1, 'Suburban Station', 39.9539, -75.1677, line='Joint')
+    overbrook = make_station(2, 'Overbrook', 39.9898, -75.2495, zip_code='19151')
+    wynnewood = make_station(3, 'Wynnewood', 40.0024, -75.2722, zip_code='19096')
+    upsal = make_station(4, 'Upsal', 40.0424, -75.1904, line='Chestnut Hill West Line', zip_code='19144')
+    university_city = make_station(5, 'University City', 39.9480, -75.1903, line='Joint', zip_code='19104')
+    return StationCatalog({
+        'Philadelphia': [suburban, overbrook, upsal, university_city],
+        'Montgomery': [overbrook, wynnewood],
+    })
+
+def test_station_named(catalog):
+    assert catalog.station_named('Suburban Station')['Id'] == 1
+    assert catalog.station_named('  suburban   station ')['Id'] == 1
+    assert catalog.station_named('Nowhere') is None
+
+def test_shared_station_indexed_once(catalog):
+    assert len(catalog.stations) == 5
+    assert catalog.by_area['Montgomery'] == {2, 3}
+
+@pytest.mark.parametrize('line', ['Paoli/Thorndale', 'paoli-thorndale line', 'Paoli Thorndale Line', 'Paoli  /Thorndale'])
+def test_candidates_by_line(line, catalog):
+    names = [station['Name'] for station in catalog.candidates('Philadelphia', line=line)]
+    assert names == ['Suburban Station', 'Overbrook']
+
+def test_joint_stations_on_the_lines_they_serve(catalog):
+    names = [station['Name'] for station in catalog.candidates('Philadelphia', line='Media/Elwyn')]
+    assert names == ['Suburban Station', 'University City']
+    assert catalog.candidates('Philadelphia', line='Joint') == []
+
+def test_unknown_joint_station_on_every_line():
+    catalog = StationCatalog({
+        'Philadelphia': [make_station(1, 'New Junction', 39.95, -75.16, line='Joint')],
+    })
+    assert [station['Id'] for station in catalog.stations_on_line('Trenton')] == [1]
+
+def test_candidates_exclude_stations(catalog):
+    names = [
+        station['Name'] for station
+        in catalog.candidates('Philadelphia', exclude_stations=['Overbrook'])
+    ]
+    assert names == ['Suburban Station', 'Upsal', 'University City']
+
+def test_candidates_by_zip(catalog):
+    names = [station['Name'] for station in catalog.candidates('Montgomery', zip_code='19096')]
+    assert names == ['Wynnewood']
+
+def test_candidates_no_match(catalog):
+    assert catalog.candidates('Philadelphia', line='Fox Chase') == [catalog.stations[1]]
+    assert catalog.candidates('Philadelphia', line='Nowhere') == []
+    assert catalog.candidates('Nowhere') == []
+
+def test_stations_on_line_and_zip(catalog):
+    assert [station['Id'] for station in catalog.stations_on_line('Paoli/Thorndale')] == [1, 2, 3]
+    assert [station['Id'] for station in catalog.stations_on_line('Airport')] == [1, 5]
+    assert [station['Id'] for station in catalog.stations_in_zip('19144')] == [4]
+
+def test_coordinate_arrays(catalog):
+    assert catalog.station_ids.tolist() == [1, 2, 3, 4, 5]
+    assert catalog.latitudes.flags['C_CONTIGUOUS']
+    assert catalog.latitudes[catalog.row_by_id[3]] == 40.0024
+
+def test_rank(catalog):
+    # Near Wynnewood
+    origin = (40.0010, -75.2700)
+    ranked = catalog.rank(origin, catalog.candidates('Philadelphia'))
+    assert [station['Name'] for station in ranked] == ['Overbrook', 'Upsal', 'University City', 'Suburban Station']
+    assert [station['Name'] for station in catalog.rank(origin, catalog.candidates('Philadelphia'), 1)] == ['Overbrook']
+    assert catalog.rank(origin, []) == []
+
+def test_nearest_stations_for_batch(catalog):
+    origins = [(40.0010, -75.2700), (39.9530, -75.1650)]
+    nearest = catalog.nearest_stations(origins, limit=2)
+    assert [[station['Name'] for station in row] for row in nearest] == [
+        ['Wynnewood', 'Overbrook'],
+        ['Suburban Station', 'University City'],
+    ]
+
+def test_distances_from(catalog):
+    distances = catalog.distances_from([(39.9539, -75.1677)])
+    assert distances.shape == (1, 5)
+    assert distances[0][0] == pytest.approx(0.0)
+    assert catalog.distance_to((39.9539, -75.1677), catalog.stations[1]) == pytest.approx(0.0)
@@ -0,0 +1,134 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from helpers import make_station
+from app.services.station_snapshot import (
+    download_snapshot, read_snapshot, seed_data_version, upload_snapshot, write_snapshot,
+)
+
+
+class FakeS3Client():
+    """Keeps objects in memory, by (bucket, key)."""
+    def __init__(self):
+        self.objects = {}
+
+    def upload_file(self, path, bucket, key):
+        with open(path, 'rb') as file:
+            self.objects[(bucket, key)] = file.read()
+
+    def download_file(self, bucket, key, path):
+        if (bucket, key) not in self.objects:
+            raise FileNotFoundError(key)
+        with open(path, 'wb') as file:
+            file.write(self.objects[(bucket, key)])
+
+@pytest.fixture
+def stations_by_searchable_area():
+    suburban = make_station(1, 'Suburban Station', 39.9539, -75.1677)
+    overbrook = make_station(2, 'Overbrook', 39.9898, -75.2495)
+    wynnewood = make_station(3, 'Wynnewood', 40.0024, -75.2722)
+    return {
+        'Philadelphia': [suburban, overbrook],
+        'Montgomery': [overbrook, wynnewood],
+    }
+
+def test_round_trip(stations_by_searchable_area, tmp_path):
+    path = str(tmp_path / 'stations.snapshot')
+    write_snapshot(path, stations_by_searchable_area)
+
+    assert read_snapshot(path) == stations_by_searchable_area
+
+def test_shared_station_stored_once(stations_by_searchable_area, tmp_path):
+    path = str(tmp_path / 'stations.snapshot')
+    write_snapshot(path, stations_by_searchable_area)
+
+    loaded = read_snapshot(path)
+    assert loaded['Philadelphia'][1] is loaded['Montgomery'][0]
+
+def test_missing_snapshot(tmp_path):
+    assert read_snapshot(str(tmp_path / 'missing.snapshot')) is None
+
+def test_stale_snapshot(stations_by_searchable_area, tmp_path):
+    path = str(tmp_path / 'stations.snapshot')
+    write_snapshot(path, stations_by_searchable_area)
+    time.sleep(0.01)
+
+    assert read_snapshot(path, max_age=0) is None
+    assert read_snapshot(path, max_age=60) is not None
+
+def test_snapshot_from_other_seed_data(stations_by_searchable_area, tmp_path):
+    path = str(tmp_path / 'stations.snapshot')
+    write_snapshot(path, stations_by_searchable_area, data_version='v1')
+
+    assert read_snapshot(path, data_version='v1') == stations_by_searchable_area
+    assert read_snapshot(path, data_version='v2') is None
+    # Without a version to compare against, any snapshot is accepted
+    assert read_snapshot(path) == stations_by_searchable_area
+
+def test_seed_data_version(tmp_path):
+    seeds_path = tmp_path / 'seeds'
+    seeds_path.mkdir()
+    (seeds_path / '001_seed_station_data.py').write_text('seed()')
+    (seeds_path / 'stations.kmz').write_bytes(b'stations')
+    (seeds_path / '__pycache__').mkdir()
+    version = seed_data_version(str(seeds_path))
+
+    assert seed_data_version(str(seeds_path)) == version
+    (seeds_path / 'stations.kmz').write_bytes(b'more stations')
+    assert seed_data_version(str(seeds_path)) != version
+    assert seed_data_version(str(tmp_path / 'missing')) is None
+
+def test_unknown_format(tmp_path):
+    path = str(tmp_path / 'stations.snapshot')
+    with open(path, 'wb') as snapshot:
+        snapshot.write(b'not a station snapshot')
+
+    assert read_snapshot(path) is None
+
+def test_no_temporary_file_left(stations_by_searchable_area, tmp_path):
+    path = str(tmp_path / 'stations.snapshot')
+    write_snapshot(path, stations_by_searchable_area)
+
+    assert os.listdir(tmp_path) == ['stations.snapshot']
+
+def test_concurrent_writers(stations_by_searchable_area, tmp_path):
+    path = str(tmp_path / 'stations.snapshot')
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for future in [executor.submit(write_snapshot, path, stations_by_searchable_area) for _ in range(32)]:
+            future.result()
+
+    assert read_snapshot(path) == stations_by_searchable_area
+    assert os.listdir(tmp_path) == ['stations.snapshot']
+
+def test_upload_and_download(stations_by_searchable_area, tmp_path):
+    client = FakeS3Client()
+    path = str(tmp_path / 'exported' / 'stations.snapshot')
+    write_snapshot(path, stations_by_searchable_area)
+    upload_snapshot(path, 's3://snapshots/septa/stations.snapshot', client=client)
+    assert ('snapshots', 'septa/stations.snapshot') in client.objects
+
+    fetched_path = str(tmp_path / 'fetched' / 'stations.snapshot')
+    fetched = download_snapshot('s3://snapshots/septa/stations.snapshot', fetched_path, client=client)
+    assert fetched == stations_by_searchable_area
+    assert read_snapshot(fetched_path) == stations_by_searchable_area
+    assert os.listdir(tmp_path / 'fetched') == ['stations.snapshot']
+
+def test_unusable_download_keeps_existing_snapshot(stations_by_searchable_area, tmp_path):
+    client = FakeS3Client()
+    client.objects[('snapshots', 'stations.snapshot')] = b'not a station snapshot'
+    path = str(tmp_path / 'stations.snapshot')
+    write_snapshot(path, stations_by_searchable_area)
+
+    assert download_snapshot('s3://snapshots/stations.snapshot', path, client=client) is None
+    assert read_snapshot(path) == stations_by_searchable_area
+    upload_snapshot(path, 's3://snapshots/stations.snapshot', client=client)
+    assert download_snapshot('s3://snapshots/stations.snapshot', path, data_version='v2', client=client) is None
+    with pytest.raises(FileNotFoundError):
+        download_snapshot('s3://snapshots/missing.snapshot', path, client=client)
+    assert os.listdir(tmp_path) == ['stations.snapshot']
+
+@pytest.mark.parametrize('url', ['snapshots/stations.snapshot', 's3://snapshots', 's3:///stations.snapshot'])
+def test_invalid_snapshot_url(url, tmp_path):
+    with pytest.raises(ValueError):
+        upload_snapshot(str(tmp_path / 'stations.snapshot'), url, client=FakeS3Client())
@@ -92,6 +92,31 @@ resource "aws_iam_role_policy_attachment" "ecs_exec_attachment" {
   policy_arn = aws_iam_policy.ecs_exec_policy.arn
 }
 
+# Let the API read and write the station snapshot in S3
+resource "aws_iam_policy" "ecs_snapshot_policy" {
+  name        = "ecs-snapshot-policy"
+  description = "IAM policy for ECS tasks to read and write the station snapshot"
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action = [
+          "s3:GetObject",
+          "s3:PutObject",
+        ]
+        Effect   = "Allow"
+        Resource = "${var.snapshot_bucket_arn}/*"
+      },
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "ecs_snapshot_attachment" {
+  role       = aws_iam_role.ecs_task_exec.name
+  policy_arn = aws_iam_policy.ecs_snapshot_policy.arn
+}
+
 resource "aws_ecs_task_definition" "api" {
   family                   = "${var.name_prefix}-api"
   requires_compatibilities = ["FARGATE"]
@@ -117,7 +142,8 @@ resource "aws_ecs_task_definition" "api" {
       environment = [
         { name = "DATABASE_URL", value = "postgresql://${var.db_username}:${var.db_password}@${var.db_instance_address}:5432/${var.db_name}" },
         { name = "GOOGLE_API_KEY", value = "${var.google_maps_key}" },
-        { name = "CORS_ORIGINS", value = "http://${var.dns_name}" }
+        { name = "CORS_ORIGINS", value = "http://${var.dns_name}" },
+        { name = "STATION_SNAPSHOT_URL", value = "s3://${var.snapshot_bucket_name}/stations.snapshot" }
       ]
     }
   ])
@@ -77,4 +77,14 @@ variable "db_password" {
 variable "google_maps_key" {
   description = "Access key for Google Maps API"
   type        = string
+}
+
+variable "snapshot_bucket_name" {
+  description = "Name of the S3 bucket holding the station snapshot"
+  type        = string
+}
+
+variable "snapshot_bucket_arn" {
+  description = "ARN of the S3 bucket holding the station snapshot"
+  type        = string
 }
\ No newline at end of file
@@ -24,6 +24,12 @@ module "rds" {
   depends_on        = [module.vpc]
 }
 
+# S3 module
+module "s3" {
+  source      = "./s3"
+  name_prefix = var.project_name
+}
+
 # ECR Module - Using existing repository
 module "ecr" {
   source          = "./ecr"
@@ -60,6 +66,8 @@ module "ecs" {
   db_username               = var.db_username
   db_password               = var.db_password
   google_maps_key           = var.google_maps_key
+  snapshot_bucket_name      = module.s3.bucket_name
+  snapshot_bucket_arn       = module.s3.bucket_arn
 
-  depends_on = [module.alb, module.rds]
+  depends_on = [module.alb, module.rds, module.s3]
 }
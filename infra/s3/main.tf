@@ -0,0 +1,17 @@
+# Bucket for the station snapshot, so new API tasks can start without the database
+resource "aws_s3_bucket" "snapshots" {
+  bucket_prefix = "${var.name_prefix}-snapshots-"
+  force_destroy = true
+
+  tags = {
+    Name = "${var.name_prefix}-snapshots"
+  }
+}
+
+resource "aws_s3_bucket_public_access_block" "snapshots" {
+  bucket                  = aws_s3_bucket.snapshots.id
+  block_public_acls       = true
+  block_public_policy     = true
+  ignore_public_acls      = true
+  restrict_public_buckets = true
+}
@@ -0,0 +1,3 @@
+variable "name_prefix" {
+  description = "Prefix to use for resource names"
+}